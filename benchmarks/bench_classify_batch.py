@@ -0,0 +1,58 @@
+# Compares per-document classification with classify_batch on the FakeBackend, with the
+# local first-pass classifier off and then on: LLM calls, wall time and prompt tokens.
+# Usage: python benchmarks/bench_classify_batch.py [--docs 200] [--latency 0.05] [--batch-size 32]
+import os
+import sys
+import io
+import time
+import argparse
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("LLM_BACKEND", "fake") # Never touch the live API from a benchmark
+
+from llm_backends import FakeBackend
+from llm_cache import ResponseCache
+from llm_wrapper import LLMWrapper
+from memory_module import SharedMemory
+from classifier_agent import ClassifierAgent
+from local_classifier import LocalIntentClassifier
+from bench_pipeline import make_corpus
+
+def make_agent(args, threshold: float):
+    backend = FakeBackend(latency=args.latency, error_rate=args.error_rate, seed=42)
+    llm = LLMWrapper(backend=backend, cache=ResponseCache(max_entries=0))
+    local = LocalIntentClassifier(threshold=threshold)
+    return ClassifierAgent(llm, SharedMemory(), local), backend, llm
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-document vs packed batch classification")
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--local-threshold", type=float, default=0.9)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.docs)
+    single = lambda agent: [agent.classify(doc) for doc in corpus]
+    batch = lambda agent: agent.classify_batch(corpus, max_batch_size=args.batch_size)
+    off = 2.0 # Above any confidence: the local model never decides
+    runs = {
+        "single": (single, off),
+        "batch": (batch, off),
+        "local+single": (single, args.local_threshold),
+        "local+batch": (batch, args.local_threshold),
+    }
+    for mode, (run, threshold) in runs.items():
+        agent, backend, llm = make_agent(args, threshold)
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()): # The agent prints per document
+            run(agent)
+        elapsed = time.perf_counter() - started
+        tokens = sum(stats["prompt_tokens"] for stats in llm.profile_stats.snapshot().values())
+        print(f"{mode:>12}: {args.docs} docs, {backend.calls} LLM calls, {elapsed:.2f}s "
+              f"({elapsed / args.docs * 1000:.1f} ms/doc), {tokens} prompt tokens")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# EmailAgent with header pre-parsing (sender and subject read from the RFC 5322 headers, LLM asked
+# for intent, urgency and summary only) versus whole-email LLM extraction, on the FakeBackend with
+# a per-output-token decode cost: prompt/output tokens, latency per email and header accuracy
+# (the FakeBackend answers a fixed sender, standing in for a model that guesses).
+# Usage: python benchmarks/bench_email_headers.py [--emails 100] [--latency 0.05] [--token-latency 0.01]
+import os
+import sys
+import io
+import time
+import argparse
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("LLM_BACKEND", "fake") # Never touch the live API from a benchmark
+
+from llm_backends import FakeBackend
+from llm_cache import ResponseCache
+from llm_wrapper import LLMWrapper
+from memory_module import SharedMemory
+from email_agent import EmailAgent
+
+EMAIL_TEMPLATE = """From: {name} <{address}>
+To: sales@yourcompany.com
+Subject: {subject}
+Date: Mon, 4 Mar 2024 09:{minute:02d}:00 +0000
+Message-ID: <{i}@mail.example.net>
+
+Dear Sales Team,
+
+We are looking for a quote on {units} units of your Model X widgets for our plant.
+Please include your best price, the lead time and the shipping terms to our warehouse.
+We would also like to know whether a framework agreement for the year is possible.
+
+Kind regards,
+{name}
+Procurement
+"""
+
+def make_emails(n: int) -> list:
+    names = ["Jane Roe", "Ravi Patel", "Mei Chen", "Lukas Weber", "Ana Souza"]
+    emails = []
+    for i in range(n):
+        name = names[i % len(names)]
+        address = f"{name.split()[0].lower()}.{i}@client{i % 7}.example.com"
+        subject = f"RFQ {1000 + i}: Model X widgets"
+        expected = {"sender_name": name, "sender_email": address, "subject": subject}
+        emails.append((EMAIL_TEMPLATE.format(name=name, address=address, subject=subject, minute=i % 60, i=i, units=100 + i), expected))
+    return emails
+
+def run(emails: list, args, header_fields):
+    backend = FakeBackend(latency=args.latency, output_token_latency=args.token_latency, seed=3)
+    llm = LLMWrapper(backend=backend, cache=ResponseCache(max_entries=0))
+    agent = EmailAgent(llm, SharedMemory())
+    agent.header_fields = header_fields
+    correct = 0
+    started = time.perf_counter()
+    for content, expected in emails:
+        with contextlib.redirect_stdout(io.StringIO()): # The agent prints per email
+            result = agent.process_email(content, "bench")
+        correct += sum(result.get(field) == value for field, value in expected.items())
+    elapsed = time.perf_counter() - started
+    stats = llm.profile_stats.snapshot()["email_extract"]
+    return elapsed, stats, correct
+
+def main():
+    parser = argparse.ArgumentParser(description="Email header pre-parsing benchmark")
+    parser.add_argument("--emails", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--token-latency", type=float, default=0.01, help="fake decode seconds per output token")
+    args = parser.parse_args()
+
+    emails = make_emails(args.emails)
+    for mode, header_fields in (("LLM only", []), ("headers parsed", EmailAgent.header_fields)):
+        elapsed, stats, correct = run(emails, args, header_fields)
+        print(f"{mode:>14}: {elapsed / args.emails * 1000:.0f} ms/email, {stats['prompt_tokens'] / args.emails:.0f} prompt + "
+              f"{stats['output_tokens'] / args.emails:.0f} output tokens/email, "
+              f"header fields correct {correct}/{3 * args.emails}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# Quoted-reply, signature and disclaimer stripping on a synthetic corpus of email threads (a new
+# message on top of Gmail ">" and Outlook From/Sent reply history, with signatures, mobile footers
+# and legal disclaimers): normalize throughput, bytes/tokens saved per message, whether the new
+# message survives intact, EmailAgent prompt tokens and classification accuracy with the
+# normalizer off and on. The FakeBackend classifies by keyword, so a complaint whose quoted history
+# talks about invoices and quotes stands in for a model misled by the thread. A handful of
+# adversarial emails (legal words in the body, a "Thanks!" opening line or one above an item list)
+# must come through whole.
+# Usage: python benchmarks/bench_email_normalizer.py [--threads 200] [--depth 4]
+import os
+import sys
+import io
+import time
+import random
+import argparse
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("LLM_BACKEND", "fake") # Never touch the live API from a benchmark
+
+from llm_backends import FakeBackend
+from llm_cache import ResponseCache
+from llm_wrapper import LLMWrapper
+from memory_module import SharedMemory
+from email_agent import EmailAgent
+from classifier_agent import ClassifierAgent
+from local_classifier import LocalIntentClassifier
+from email_normalizer import EmailNormalizer
+
+NEW_MESSAGES = [
+    ("Complaint", "The replacement pumps arrived damaged again and I am very dissatisfied. I expect a refund for order {n}."),
+    ("Complaint", "Order {n} is three weeks late and nobody answers the phone. We are dissatisfied with the service."),
+    ("General Inquiry", "Could you tell me whether your warehouse is open on public holidays? We plan a pickup for order {n}."),
+]
+QUOTED_BODIES = [
+    "Please find attached invoice INV-{n} for the pumps. Amount due: 4,250.00 EUR within 30 days.",
+    "Thank you for the quote. We would like to confirm 40 units at the quoted price for order {n}.",
+    "Could you send us an updated quote including shipping to our Rotterdam site?",
+    "Invoice INV-{n} has been paid today; the remittance advice is attached.",
+]
+SIGNATURE = """Kind regards,
+{name}
+Procurement Manager | Client Industries B.V.
+Tel: +31 20 555 01{n:02d} | Mobile: +31 6 5550 1{n:02d}
+www.client-industries.example.com"""
+DISCLAIMER = """CONFIDENTIALITY NOTICE: This e-mail and any attachments are confidential and may be privileged.
+It is intended solely for the named addressee. If you have received this message in error, please
+notify the sender immediately and delete it; any dissemination or copying is prohibited."""
+# (email, text that must survive normalization, intent)
+ADVERSARIAL = [
+    ("Hi,\n\nThe new EU regulation is legally binding from 1 June and requires confidential handling of customer "
+     "records. Please confirm your compliance plan by Friday.\n\nBest,\nSam",
+     "The new EU regulation is legally binding from 1 June and requires confidential handling of customer records.", "Regulation"),
+    ("Hi,\n\nThe USB stick you shipped contained a virus, and the confidential files on it were corrupted. "
+     "I am dissatisfied and expect a replacement.\n\nSam",
+     "The USB stick you shipped contained a virus, and the confidential files on it were corrupted.", "Complaint"),
+    ("From: Sam Lee <sam@client.example.com>\nTo: sales@yourcompany.com\nSubject: Pumps\n\nThanks!\n"
+     "Please quote the following:\n- 10 pumps\n- 20 valves\n- 30 hoses\n- 40 filters",
+     "- 30 hoses\n- 40 filters", "RFQ"),
+    ("Hello,\n\nThis message is privileged information for our legal team only; please forward the "
+     "regulation summary to them.\n\nThanks,\nSam\n\nOn Mon, 4 Mar 2024, Ana wrote:\n> Invoice attached.",
+     "This message is privileged information for our legal team only", "Regulation"),
+    ("Hello team,\nPlease find our order details below, we would like a quote for the following.\nThanks!\nItems:\n"
+     "1. 500 widgets\n2. 200 gadgets\n3. 100 bolts\nDeliver to Berlin by Friday, total budget 12,000 EUR.",
+     "2. 200 gadgets\n3. 100 bolts\nDeliver to Berlin by Friday, total budget 12,000 EUR.", "RFQ"),
+]
+NAMES = ["Jane Roe", "Ravi Patel", "Mei Chen", "Lukas Weber", "Ana Souza"]
+
+def quote_gmail(text: str, name: str) -> str:
+    quoted = "\n".join("> " + line if line else ">" for line in text.split("\n"))
+    return f"On Mon, 4 Mar 2024 at 09:12, {name} <{name.split()[0].lower()}@client.example.com> wrote:\n{quoted}"
+
+def quote_outlook(text: str, name: str) -> str:
+    return (f"________________________________\nFrom: {name} <{name.split()[0].lower()}@client.example.com>\n"
+            f"Sent: Monday, March 4, 2024 9:12 AM\nTo: Sales <sales@yourcompany.com>\nSubject: RE: Order\n\n{text}")
+
+def make_threads(n: int, depth: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    threads = []
+    for i in range(n):
+        intent, new = NEW_MESSAGES[i % len(NEW_MESSAGES)]
+        new = new.format(n=1000 + i)
+        name = NAMES[i % len(NAMES)]
+        history = ""
+        for level in range(depth):
+            body = rng.choice(QUOTED_BODIES).format(n=2000 + i * 10 + level)
+            message = f"Hello,\n\n{body}\n\n{SIGNATURE.format(name=rng.choice(NAMES), n=level)}\n\n{DISCLAIMER}"
+            if history:
+                message += "\n\n" + history
+            history = (quote_gmail if rng.random() < 0.5 else quote_outlook)(message, rng.choice(NAMES))
+        footer = "\n\nSent from my iPhone" if i % 4 == 0 else ""
+        body = f"Hi team,\n\n{new}\n\n{SIGNATURE.format(name=name, n=i % 100)}{footer}\n\n{DISCLAIMER}\n\n{history}"
+        content = f"From: {name} <{name.split()[0].lower()}.{i}@client.example.com>\nTo: sales@yourcompany.com\nSubject: RE: Order {1000 + i}\n\n{body}"
+        threads.append((content, new, intent))
+    return threads
+
+def run_agent(threads: list, normalizer) -> dict:
+    llm = LLMWrapper(backend=FakeBackend(seed=1), cache=ResponseCache(max_entries=0))
+    agent = EmailAgent(llm, SharedMemory(), normalizer=normalizer)
+    with contextlib.redirect_stdout(io.StringIO()): # The agent prints per email
+        for content, _, _ in threads:
+            agent.process_email(content, "bench")
+    return llm.profile_stats.snapshot()["email_extract"]
+
+def run_classifier(threads: list, normalizer):
+    llm = LLMWrapper(backend=FakeBackend(seed=1), cache=ResponseCache(max_entries=0))
+    local = LocalIntentClassifier(threshold=1.01) # Never confident: every input goes to the (fake) LLM
+    agent = ClassifierAgent(llm, SharedMemory(), local=local, normalizer=normalizer)
+    correct = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for content, _, intent in threads:
+            correct += agent.classify(content)[1] == intent
+    return correct, llm.profile_stats.snapshot()["classify"]
+
+def main():
+    parser = argparse.ArgumentParser(description="Email normalizer benchmark")
+    parser.add_argument("--threads", type=int, default=200)
+    parser.add_argument("--depth", type=int, default=4, help="quoted replies below the new message")
+    args = parser.parse_args()
+
+    threads = make_threads(args.threads, args.depth)
+    normalizer = EmailNormalizer()
+    started = time.perf_counter()
+    results = [normalizer.normalize_with_stats(content) for content, _, _ in threads]
+    elapsed = time.perf_counter() - started
+    kept = sum(new in text for (text, _), (_, new, _) in zip(results, threads))
+    bytes_in = sum(stats["bytes_in"] for _, stats in results)
+    print(f"normalize: {elapsed / args.threads * 1e6:.0f} us/message ({bytes_in / elapsed / 1e6:.1f} MB/s), "
+          f"{sum(stats['bytes_saved'] for _, stats in results) / args.threads:.0f} of {bytes_in / args.threads:.0f} bytes and "
+          f"~{sum(stats['tokens_saved'] for _, stats in results) / args.threads:.0f} tokens saved per message, "
+          f"new message kept in {kept}/{args.threads}")
+    kept = sum(keep in normalizer.normalize(content) for content, keep, _ in ADVERSARIAL)
+    correct, _ = run_classifier(ADVERSARIAL, EmailNormalizer())
+    print(f"adversarial: content kept in {kept}/{len(ADVERSARIAL)}, intent correct {correct}/{len(ADVERSARIAL)}")
+
+    for mode, enabled in (("off", False), ("on", True)):
+        extract = run_agent(threads, EmailNormalizer(enabled=enabled))
+        correct, classify = run_classifier(threads, EmailNormalizer(enabled=enabled))
+        print(f"normalizer {mode:>3}: EmailAgent {extract['prompt_tokens'] / args.threads:.0f} prompt tokens/email, "
+              f"classifier {classify['prompt_tokens'] / args.threads:.0f} prompt tokens/email, "
+              f"intent correct {correct}/{args.threads}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# Cold-start guard: measures how long `import main` takes in a fresh interpreter and
+# checks that heavy dependencies (Gemini SDK, pypdf) are not loaded until first use.
+# Exits non-zero if the median import time exceeds the budget or a heavy module leaks in.
+# Usage: python benchmarks/bench_import_time.py [--runs 5] [--budget-ms 250] [--module main]
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Modules that must stay out of sys.modules after a plain import
+HEAVY_MODULES = ["google.generativeai", "grpc", "pypdf"]
+
+PROBE = """
+import sys, time, json
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+def measure(module: str) -> dict:
+    code = PROBE.format(module=module, heavy=HEAVY_MODULES)
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time (cold start) guard")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=250.0)
+    parser.add_argument("--module", default="main")
+    args = parser.parse_args()
+
+    samples = [measure(args.module) for _ in range(args.runs)]
+    median_ms = statistics.median(sample["seconds"] for sample in samples) * 1000
+    leaked = sorted({name for sample in samples for name in sample["loaded"]})
+
+    print(f"import {args.module}: median {median_ms:.1f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+    if leaked:
+        print(f"FAIL: heavy modules loaded at import time: {', '.join(leaked)}")
+    if median_ms > args.budget_ms:
+        print("FAIL: import time over budget")
+    if leaked or median_ms > args.budget_ms:
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# Evaluates PDF page selection strategies on synthetic invoices with different layouts:
+# "prefix" (leading pages until the token budget, the original behaviour), "priority" (first and
+# last pages, then keyword pages) and "ranked" (PageRanker scores). Reports field recall, prompt
+# tokens and pages whose text had to be extracted, on the FakeBackend (which extracts fields by
+# regex from the excerpt it receives).
+# Usage: python benchmarks/bench_page_ranking.py [--docs 40] [--seed 3]
+import os
+import sys
+import io
+import random
+import argparse
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("LLM_BACKEND", "fake") # Never touch the live API from a benchmark
+
+from llm_backends import FakeBackend
+from llm_cache import ResponseCache
+from llm_wrapper import LLMWrapper
+from memory_module import SharedMemory
+from pdf_agent import PDFAgent
+from document_handle import DocumentHandle
+from pdf_text_cache import PDFTextCache
+from synthetic_pdf import make_pdf
+
+STRATEGIES = {
+    "prefix": {"strategy": "priority", "first": 10 ** 6, "last": 0, "keywords": []},
+    "priority": {"strategy": "priority"},
+    "ranked": {"strategy": "ranked"},
+}
+
+def item_page(rng, number: int, count: int, invoice: str) -> str:
+    lines = [f"Invoice {invoice} - page {number} of {count}"]
+    lines += [f"Item {number * 100 + j}: part SKU-{rng.randint(1000, 9999)} qty {rng.randint(1, 9)} at "
+              f"{rng.randint(5, 90)}.50 = {rng.randint(10, 900)}.00" for j in range(rng.randint(24, 34))]
+    return "\n".join(lines)
+
+def prose_page(rng, title: str) -> str:
+    sentences = ["We appreciate your continued business and the invoice below reflects the agreed scope.",
+                 "Please contact our accounts team with any questions about this statement.",
+                 "Goods remain the property of the vendor until paid in full.",
+                 "Late payments may incur interest as permitted by law."]
+    return title + "\n" + "\n".join(rng.choice(sentences) for _ in range(rng.randint(20, 30)))
+
+def make_invoice(rng, layout: str):
+    """
+    Returns (pages, expected_fields) for one synthetic invoice.
+    """
+    invoice = f"INV-{rng.randint(1000, 9999)}"
+    fields = {
+        "invoice_number": invoice,
+        "total_amount": f"{rng.randint(1, 90)},{rng.randint(100, 999)}.00",
+        "currency": rng.choice(["USD", "EUR", "GBP"]),
+        "date_issued": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "vendor_name": rng.choice(["Acme Industrial Supply", "Northwind Traders", "Initech Components"]),
+        "customer_name": rng.choice(["Globex Corporation", "Umbrella Logistics", "Stark Fabrication"]),
+    }
+    header = (f"Invoice number: {invoice}\nDate issued: {fields['date_issued']}\nVendor: {fields['vendor_name']}\n"
+              f"Bill to: {fields['customer_name']}")
+    totals = f"Subtotal: {rng.randint(1, 9)},000.00\nTotal due: {fields['total_amount']} {fields['currency']}"
+    items = rng.randint(6, 40)
+    count = items + 4 # Upper bound for the running headers
+
+    body = [item_page(rng, i + 1, count, invoice) for i in range(items)]
+    if layout == "standard":
+        pages = [header + "\n" + body[0]] + body[1:-1] + [body[-1] + "\n" + totals]
+        pages += [prose_page(rng, "Terms and conditions") for _ in range(2)]
+    elif layout == "cover letter":
+        pages = [prose_page(rng, "Dear customer,"), header + "\n" + body[0]] + body[1:-1] + [body[-1] + "\n" + totals]
+    elif layout == "totals mid-document":
+        # Totals close the invoice proper; timesheet appendices follow
+        pages = [header + "\n" + body[0]] + body[1:items // 2] + [totals]
+        pages += [item_page(rng, items + i, count, invoice).replace("Item", "Timesheet entry") for i in range(items // 2)]
+    else: # "summary page": header page, then a remittance summary, then the detail
+        pages = [header, f"Remittance summary\n{totals}\nPlease pay by bank transfer."] + body
+    return pages, fields
+
+def evaluate(documents, selection: dict):
+    backend = FakeBackend(seed=1)
+    llm = LLMWrapper(backend=backend, cache=ResponseCache(max_entries=0))
+    agent = PDFAgent(llm, SharedMemory(), page_selection=selection)
+    found = total = extracted = 0
+    per_layout = {}
+    for layout, data, fields in documents:
+        document = DocumentHandle(data, text_cache=PDFTextCache())
+        with contextlib.redirect_stdout(io.StringIO()): # The agent prints per document
+            result = agent.process_pdf(document, "bench")
+        hits = sum(result.get(field) == value for field, value in fields.items())
+        found += hits
+        total += len(fields)
+        extracted += len(document.cached_page_texts())
+        layout_found, layout_total = per_layout.get(layout, (0, 0))
+        per_layout[layout] = (layout_found + hits, layout_total + len(fields))
+    tokens = llm.profile_stats.snapshot()["pdf_extract"]["prompt_tokens"]
+    return found / total, tokens, extracted, per_layout
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF page selection strategy evaluation")
+    parser.add_argument("--docs", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    layouts = ["standard", "cover letter", "totals mid-document", "summary page"]
+    documents = []
+    for i in range(args.docs):
+        layout = layouts[i % len(layouts)]
+        pages, fields = make_invoice(rng, layout)
+        documents.append((layout, make_pdf(pages), fields))
+
+    print(f"{args.docs} synthetic invoices ({', '.join(layouts)})")
+    for name, selection in STRATEGIES.items():
+        recall, tokens, extracted, per_layout = evaluate(documents, selection)
+        breakdown = ", ".join(f"{layout} {hits / count:.0%}" for layout, (hits, count) in per_layout.items())
+        print(f"{name:>9}: field recall {recall:.1%}, {tokens / args.docs:.0f} prompt tokens/doc, "
+              f"{extracted / args.docs:.1f} pages extracted/doc ({breakdown})")
+
+if __name__ == "__main__":
+    main()
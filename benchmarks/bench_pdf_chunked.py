@@ -0,0 +1,67 @@
+# Page-selection extraction (one LLM call) versus map-reduce chunked extraction (one call per
+# window, run concurrently) on a long synthetic invoice, on the FakeBackend: fields recovered,
+# LLM calls, wall time and the summed per-call latency a sequential loop would have paid.
+# Usage: python benchmarks/bench_pdf_chunked.py [--pages 60] [--latency 0.2]
+import os
+import sys
+import io
+import time
+import asyncio
+import argparse
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("LLM_BACKEND", "fake") # Never touch the live API from a benchmark
+
+from llm_backends import FakeBackend
+from llm_cache import ResponseCache
+from llm_wrapper import LLMWrapper
+from memory_module import SharedMemory
+from pdf_agent import PDFAgent
+from pdf_parallel import ParallelPDFExtractor
+from synthetic_pdf import make_pdf, invoice_pages
+
+EXPECTED = {
+    "invoice_number": "INV-2041",
+    "total_amount": "28,188.00",
+    "currency": "USD",
+    "date_issued": "2024-03-01",
+    "vendor_name": "Acme Industrial Supply",
+    "customer_name": "Globex Corporation",
+}
+
+def make_agent(args):
+    backend = FakeBackend(latency=args.latency, latency_jitter=0.3, distribution="uniform", seed=7)
+    llm = LLMWrapper(backend=backend, cache=ResponseCache(max_entries=0))
+    agent = PDFAgent(llm, SharedMemory(), extractor=ParallelPDFExtractor(workers=1), chunking={"max_chunks": args.max_chunks})
+    return agent, backend, llm
+
+def main():
+    parser = argparse.ArgumentParser(description="Page selection vs chunked PDF extraction")
+    parser.add_argument("--pages", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--max-chunks", type=int, default=16)
+    args = parser.parse_args()
+
+    data = make_pdf(invoice_pages(args.pages))
+    runs = {
+        "page selection": lambda agent: agent.process_pdf(data, "bench", chunked=False),
+        "chunked (threads)": lambda agent: agent.process_pdf(data, "bench", chunked=True),
+        "chunked (async)": lambda agent: asyncio.run(agent.aprocess_pdf(data, "bench", chunked=True)),
+    }
+    for mode, run in runs.items():
+        agent, backend, llm = make_agent(args)
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()): # The agent prints progress
+            result = run(agent)
+        elapsed = time.perf_counter() - started
+        stats = llm.profile_stats.snapshot()["pdf_extract"]
+        found = sum(result.get(field) == value for field, value in EXPECTED.items())
+        print(f"{mode:>18}: {found}/{len(EXPECTED)} fields, {backend.calls} LLM calls, {elapsed:.2f}s wall, "
+              f"{stats['latency_seconds']:.2f}s summed call latency, {stats['prompt_tokens']} prompt tokens")
+        if "field_pages" in result:
+            print(f"{'':>20}total_amount from pages {result['field_pages'].get('total_amount')}, "
+                  f"conflicts: {result['conflicts'] or 'none'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# Peak Python heap (tracemalloc) while a large synthetic PDF goes through the classify path
+# (sniff, hash, page count, first and last page text), for each input kind. "in place" hands the
+# input to DocumentHandle as is; "copied" first materialises it as bytes, as callers used to.
+# Usage: python benchmarks/bench_pdf_memory.py [--pages 2000]
+import io
+import os
+import sys
+import mmap
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from document_handle import DocumentHandle
+from format_sniffer import format_sniffer
+from synthetic_pdf import make_pdf, contract_pages
+
+def run(source):
+    with DocumentHandle(source) as document:
+        assert format_sniffer.sniff(document) == "PDF"
+        document.sha256
+        count = document.page_count
+        document.page_text(0)
+        document.page_text(count - 1)
+
+def copied(source) -> bytes:
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return f.read()
+    if hasattr(source, "read"):
+        return source.read()
+    return bytes(source)
+
+def measure(make_source, copy: bool):
+    source = make_source()
+    tracemalloc.start()
+    started = time.perf_counter()
+    run(copied(source) if copy else source)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if hasattr(source, "close"):
+        source.close()
+    return peak, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF input memory benchmark")
+    parser.add_argument("--pages", type=int, default=2000)
+    args = parser.parse_args()
+
+    data = make_pdf(contract_pages(args.pages))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "large.pdf")
+        with open(path, "wb") as f:
+            f.write(data)
+
+        def mapped():
+            with open(path, "rb") as f:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        inputs = {
+            "path": lambda: path,
+            "bytes": lambda: data,
+            "bytearray": lambda: bytearray(data),
+            "memoryview": lambda: memoryview(data),
+            "file": lambda: open(path, "rb"),
+            "BytesIO": lambda: io.BytesIO(data),
+            "mmap": mapped,
+        }
+        run(data) # Warm-up: imports pypdf outside the measurements
+
+        print(f"{args.pages} pages, {len(data) / 1e6:.1f} MB")
+        print(f"{'input':<12}{'in place peak':>15}{'copied peak':>13}{'in place s':>12}{'copied s':>10}")
+        for name, make_source in inputs.items():
+            peak, elapsed = measure(make_source, copy=False)
+            copy_peak, copy_elapsed = measure(make_source, copy=True)
+            print(f"{name:<12}{peak / 1e6:>12.2f} MB{copy_peak / 1e6:>10.2f} MB{elapsed:>12.3f}{copy_elapsed:>10.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# Whole-document PDF text extraction throughput (pages/second) at different process-pool sizes,
+# on a synthetic multi-hundred-page PDF.
+# Usage: python benchmarks/bench_pdf_parallel.py [--pages 400] [--workers 1,2,4,8] [--repeat 3]
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from document_handle import DocumentHandle
+from pdf_parallel import ParallelPDFExtractor
+from synthetic_pdf import make_pdf, contract_pages
+
+def measure(path: str, workers: int, repeat: int) -> float:
+    extractor = ParallelPDFExtractor(workers=workers, min_pages=1)
+    extractor.extract(DocumentHandle(path)) # Warm-up: starts the pool
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        texts = extractor.extract(DocumentHandle(path))
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    extractor.shutdown()
+    return len(texts) / best
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel PDF extraction scaling benchmark")
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--workers", default=None, help="comma-separated pool sizes (default: 1,2,4,... up to the core count)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    if args.workers:
+        sizes = [int(n) for n in args.workers.split(",")]
+    else:
+        sizes = [1]
+        while sizes[-1] * 2 <= cores:
+            sizes.append(sizes[-1] * 2)
+
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+        f.write(make_pdf(contract_pages(args.pages)))
+        path = f.name
+    try:
+        print(f"{args.pages}-page synthetic PDF, {cores} cores")
+        baseline = None
+        for workers in sizes:
+            rate = measure(path, workers, args.repeat)
+            baseline = baseline or rate
+            print(f"  workers={workers:>2}: {rate:8.1f} pages/s  (x{rate / baseline:.2f})")
+    finally:
+        os.remove(path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# Line item extraction from PDF tables without the LLM: accuracy of the layout-based table
+# extractor on synthetic multi-page invoices, the local time it takes, the prompt tokens the
+# header-field call spends with and without the table rows, and the output tokens an LLM would
+# have spent writing the line items as JSON.
+# Usage: python benchmarks/bench_pdf_tables.py [--items 50,200,800]
+import os
+import sys
+import io
+import json
+import time
+import argparse
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("LLM_BACKEND", "fake") # Never touch the live API from a benchmark
+
+from llm_backends import FakeBackend
+from llm_cache import ResponseCache
+from llm_wrapper import LLMWrapper
+from memory_module import SharedMemory
+from pdf_agent import PDFAgent
+from document_handle import DocumentHandle
+from pdf_text_cache import PDFTextCache
+from prompt_builder import local_token_estimate
+from synthetic_pdf import make_pdf, table_invoice_pages
+
+def run(data: bytes, tables: bool, chunked: bool):
+    llm = LLMWrapper(backend=FakeBackend(seed=1), cache=ResponseCache(max_entries=0))
+    agent = PDFAgent(llm, SharedMemory())
+    agent.extract_tables = tables
+    document = DocumentHandle(data, text_cache=PDFTextCache())
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()): # The agent prints progress
+        result = agent.process_pdf(document, "bench", chunked=chunked)
+    elapsed = time.perf_counter() - started
+    return result, elapsed, llm.profile_stats.snapshot()["pdf_extract"]
+
+def main():
+    parser = argparse.ArgumentParser(description="Layout-based line item extraction")
+    parser.add_argument("--items", default="50,200,800")
+    args = parser.parse_args()
+
+    for items in [int(n) for n in args.items.split(",")]:
+        pages, expected = table_invoice_pages(items)
+        data = make_pdf(pages)
+        result, elapsed, stats = run(data, tables=True, chunked=False)
+        found = result.get("line_items") or []
+        correct = sum(a == b for a, b in zip(found, expected))
+        avoided = local_token_estimate(json.dumps(expected))
+        print(f"{items} items over {len(pages)} pages: {correct}/{items} line items exact, "
+              f"total_amount {result.get('total_amount')}, {elapsed:.2f}s")
+        for chunked in (False, True):
+            _, _, with_tables = run(data, tables=True, chunked=chunked)
+            _, _, without = run(data, tables=False, chunked=chunked)
+            mode = "chunked" if chunked else "single call"
+            print(f"  {mode:>11}: {with_tables['prompt_tokens']} prompt tokens with table rows removed vs "
+                  f"{without['prompt_tokens']} with them ({with_tables['calls']} vs {without['calls']} calls)")
+        print(f"  ~{avoided} output tokens an LLM would have generated for the line items")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# Offline throughput benchmark for MultiAgentSystem using the FakeBackend.
+# Usage: python benchmarks/bench_pipeline.py [--docs 200] [--latency 0.05] [--error-rate 0.0] [--fused] [--local-threshold 1.01]
+import os
+import sys
+import io
+import time
+import asyncio
+import argparse
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("LLM_BACKEND", "fake") # Never touch the live API from a benchmark
+
+from llm_backends import FakeBackend
+from llm_cache import ResponseCache
+from llm_wrapper import LLMWrapper
+from memory_module import SharedMemory
+from main import MultiAgentSystem
+from local_classifier import LocalIntentClassifier
+
+EMAIL_TEMPLATE = """From: customer{i}@example.com
+To: sales@yourcompany.com
+Subject: RFQ #{i} for Widgets
+
+Dear Sales Team,
+Please quote {i} units of your Model X widgets.
+"""
+
+JSON_TEMPLATE = '{{"document_type": "invoice", "invoice_data": {{"invoice_number": "INV-{i}", "amount_due": {i}.50}}}}'
+
+TEXT_TEMPLATE = "Can you tell me about your pricing for enterprise solutions? (ticket {i})"
+
+def make_corpus(n: int) -> list:
+    templates = [EMAIL_TEMPLATE, JSON_TEMPLATE, TEXT_TEMPLATE]
+    return [templates[i % len(templates)].format(i=i) for i in range(n)]
+
+def make_system(args) -> MultiAgentSystem:
+    backend = FakeBackend(
+        latency=args.latency,
+        latency_jitter=args.jitter,
+        distribution=args.distribution,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=42,
+    )
+    # Caching is disabled so every document pays for its LLM calls
+    llm = LLMWrapper(backend=backend, cache=ResponseCache(max_entries=0), max_concurrency=args.concurrency)
+    llm.rate_limiter.base_backoff = 0.01
+    system = MultiAgentSystem(llm=llm, memory=SharedMemory(), fused=args.fused)
+    system.classifier_agent.local = LocalIntentClassifier(threshold=args.local_threshold)
+    return system
+
+def run_sync(system: MultiAgentSystem, corpus: list) -> float:
+    started = time.perf_counter()
+    for doc in corpus:
+        system.process_input(doc)
+    return time.perf_counter() - started
+
+def run_async(system: MultiAgentSystem, corpus: list) -> float:
+    started = time.perf_counter()
+    asyncio.run(system.aprocess_inputs(corpus))
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline MultiAgentSystem throughput benchmark")
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="median fake LLM latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.5)
+    parser.add_argument("--distribution", default="lognormal", choices=["constant", "uniform", "lognormal"])
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--skip-sync", action="store_true")
+    parser.add_argument("--fused", action="store_true", help="classify and extract Email/JSON inputs in one call")
+    parser.add_argument("--local-threshold", type=float, default=1.01, help="above 1 (the shipped default) sends every classification to the LLM")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.docs)
+    results = {}
+    async_system = make_system(args)
+    with contextlib.redirect_stdout(io.StringIO()): # Agents print per document
+        if not args.skip_sync:
+            results["sync"] = run_sync(make_system(args), corpus)
+        results["async"] = run_async(async_system, corpus)
+
+    for mode, elapsed in results.items():
+        print(f"{mode:>5}: {args.docs} docs in {elapsed:.2f}s -> {args.docs / elapsed:.1f} docs/s")
+
+    # Per-profile spend for the async run
+    for profile, stats in sorted(async_system.classifier_agent.llm.profile_stats.snapshot().items()):
+        print(f"  {profile:>13}: {stats['calls']} calls, avg {stats['avg_latency_seconds'] * 1000:.1f} ms, "
+              f"{stats['prompt_tokens']} prompt / {stats['output_tokens']} output tokens, {stats['errors']} errors")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# Builds synthetic text PDFs for the PDF benchmarks without any PDF-writing dependency.
+# make_pdf(pages) returns the bytes of a PDF with one Helvetica text page per string; lines
+# containing tabs are laid out as table cells at TAB_STOPS. contract_pages / invoice_pages /
+# table_invoice_pages produce page text.
+import random
+
+TAB_STOPS = (40, 330, 400, 480) # x positions of tab-separated cells, in points
+
+def _escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def _line_ops(line: str, y: int) -> str:
+    if "\t" not in line:
+        return f"({_escape(line)}) Tj T*"
+    # Position each cell absolutely, then return to the left margin for the next line
+    cells = " ".join(f"1 0 0 1 {x} {y} Tm ({_escape(cell)}) Tj" for x, cell in zip(TAB_STOPS, line.split("\t")))
+    return f"{cells} 1 0 0 1 40 {y} Tm T*"
+
+def make_pdf(pages: list) -> bytes:
+    count = len(pages)
+    font_id = 3 + 2 * count
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(count))
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {count} >>",
+    ]
+    for i, text in enumerate(pages):
+        body = " ".join(_line_ops(line, 760 - 12 * n) for n, line in enumerate(text.split("\n")))
+        stream = f"BT /F1 10 Tf 40 760 Td 12 TL {body} ET"
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R "
+                       f"/Resources << /Font << /F1 {font_id} 0 R >> >> >>")
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    output += b"".join(f"{offset:010d} 00000 n \n".encode("latin-1") for offset in offsets)
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return bytes(output)
+
+def contract_pages(count: int, lines_per_page: int = 40) -> list:
+    """
+    Text for a long contract: clause pages, with totals on a middle page and the last page.
+    """
+    pages = [
+        f"Master Services Agreement - page {i + 1}\n" + "\n".join(
+            f"Clause {i + 1}.{j + 1}: The parties agree that the supplier shall deliver services under schedule {j}."
+            for j in range(lines_per_page)
+        )
+        for i in range(count)
+    ]
+    if count > 2:
+        pages[count // 2] = "Schedule B - Fees\nInvoice schedule\nTotal contract value: 120,000.00 USD"
+    pages[-1] = "Signatures\nAmount due on signature: 12,000.00 USD\nTotal: 120,000.00 USD"
+    return pages
+
+def invoice_pages(count: int, lines_per_page: int = 30, terms_pages: int = 2) -> list:
+    """
+    Text for a long invoice: header fields on the first page, line items in between, the grand
+    total on the last item page, then terms-and-conditions pages.
+    """
+    pages = []
+    for i in range(count):
+        lines = [f"Invoice INV-2041 - page {i + 1} of {count}"]
+        if i == 0:
+            lines += ["Invoice number: INV-2041", "Date issued: 2024-03-01", "Vendor: Acme Industrial Supply",
+                      "Bill to: Globex Corporation", "Currency: USD"]
+        lines += [f"Item {i * lines_per_page + j + 1}: replacement part SKU-{i:03d}{j:02d} qty 2 at 14.50 = 29.00"
+                  for j in range(lines_per_page)]
+        if i == count - 1:
+            lines += ["Subtotal: 26,100.00", "Tax: 2,088.00", "Total due: 28,188.00 USD"]
+        pages.append("\n".join(lines))
+    for i in range(terms_pages):
+        pages.append(f"Terms and conditions ({i + 1})\n" + "\n".join(
+            f"Condition {i + 1}.{j + 1}: Goods remain the property of the vendor until paid in full."
+            for j in range(lines_per_page)
+        ))
+    return pages
+
+def table_invoice_pages(items: int, rows_per_page: int = 40, seed: int = 0):
+    """
+    Text for an invoice whose line items are a real (tab-positioned) table spanning pages.
+    Returns (pages, line_items) with the expected line items.
+    """
+    rng = random.Random(seed)
+    line_items = []
+    for i in range(items):
+        quantity = rng.randint(1, 20)
+        unit_price = rng.randint(100, 9999) / 100
+        line_items.append({"description": f"Part SKU-{i:04d} {rng.choice(['bracket', 'bearing', 'gasket', 'valve'])}",
+                           "quantity": quantity, "unit_price": unit_price, "amount": round(quantity * unit_price, 2)})
+    total = round(sum(item["amount"] for item in line_items), 2)
+    rows = [f"{item['description']}\t{item['quantity']}\t{item['unit_price']:.2f}\t{item['amount']:,.2f}" for item in line_items]
+    header = ["Invoice number: INV-7788", "Date issued: 2024-05-02", "Vendor: Acme Industrial Supply",
+              "Bill to: Globex Corporation", "Description\tQty\tUnit price\tAmount"]
+    pages = []
+    first = rows_per_page - len(header)
+    chunks = [rows[:first]] + [rows[i:i + rows_per_page] for i in range(first, len(rows), rows_per_page)]
+    for n, chunk in enumerate(chunks):
+        lines = [f"Invoice INV-7788 - page {n + 1} of {len(chunks)}"] + (header if n == 0 else []) + chunk
+        if n == len(chunks) - 1:
+            lines += [f"Subtotal: {total:,.2f}", f"Total due: {total:,.2f} USD"]
+        pages.append("\n".join(lines))
+    return pages, line_items
@@ -1,77 +1,274 @@
 from llm_wrapper import llm_wrapper
 from memory_module import shared_memory
-import json
-import re # For basic email/JSON detection
-from pypdf import PdfReader # For PDF detection
-import os
+from prompt_builder import PromptBuilder, local_token_estimate
+from local_classifier import local_classifier, INTENTS
+from format_sniffer import format_sniffer
+from document_handle import DocumentHandle
+from email_normalizer import email_normalizer
+import asyncio
+
+# Appended to an extraction prompt in fused classify+extract mode (see MultiAgentSystem)
+FUSED_INTENT_INSTRUCTION = f"""
+        Also classify the document's primary intent as exactly one of: {", ".join(INTENTS)} (RFQ means Request for Quote),
+        and return it under the key 'document_intent'.
+        """
 
 class ClassifierAgent:
-    def __init__(self):
-        self.llm = llm_wrapper
-        self.memory = shared_memory
+    intents = INTENTS
+
+    # Structured output for classify_batch: one entry per packed document slot
+    batch_schema = {
+        "type": "OBJECT",
+        "properties": {
+            "results": {
+                "type": "ARRAY",
+                "items": {
+                    "type": "OBJECT",
+                    "properties": {
+                        "slot": {"type": "INTEGER"},
+                        "intent": {"type": "STRING", "enum": intents},
+                    },
+                    "required": ["slot", "intent"],
+                },
+            },
+        },
+        "required": ["results"],
+    }
+
+    slot_overhead_tokens = 8 # "[Document N]" marker and separators per packed document
 
-    def classify(self, raw_input: str, thread_id: str = None):
+    def __init__(self, llm=None, memory=None, local=None, sniffer=None, normalizer=None):
+        self.llm = llm or llm_wrapper # Defaults to the global wrapper; pass one to use another backend
+        self.memory = memory or shared_memory
+        self.local = local or local_classifier # In-process first pass; the LLM only sees low-confidence inputs
+        self.sniffer = sniffer or format_sniffer # Cost-ordered format detector chain
+        self.normalizer = normalizer or email_normalizer # Drops quoted replies, signatures and disclaimers
+        self.prompts = PromptBuilder(self.llm) # Fits content to the per-task token budget
+        self.decisions = {"local": 0, "llm": 0, "fused": 0} # Which path decided each classification
+
+    def classify(self, raw_input, thread_id: str = None, mime_type: str = None):
         """
-        Classifies the format and intent of the raw input.
+        Classifies the format and intent of the raw input (text, a path, bytes or a file-like object).
+        mime_type, if known, short-circuits format sniffing.
         """
         # Step 1: Detect Format Heuristically first for efficiency
-        input_format = self._detect_format(raw_input)
+        input_format = self._detect_format(raw_input, mime_type)
+        text = self._intent_text(raw_input, input_format)
         
-        # Step 2: Use LLM for Intent Classification
+        # Step 2: Local model first; use LLM for Intent Classification only when it isn't confident
+        guess = self.local.predict(text) # (intent, confidence)
+        if self.local.is_confident(*guess):
+            return self._record_classification(input_format, guess[0], thread_id, "local", guess, text)
+        system_prompt, user_prompt = self._build_intent_prompts(text)
+        intent = self.llm.generate_response(system_prompt, user_prompt, profile="classify")
+
+        # Step 3: Log in Shared Memory
+        return self._record_classification(input_format, intent, thread_id, "llm", guess, text)
+
+    async def aclassify(self, raw_input, thread_id: str = None, mime_type: str = None):
+        """
+        Async variant of classify; awaits the LLM instead of blocking on it.
+        """
+        input_format = self._detect_format(raw_input, mime_type)
+        text = self._intent_text(raw_input, input_format)
+        guess = self.local.predict(text)
+        if self.local.is_confident(*guess):
+            return self._record_classification(input_format, guess[0], thread_id, "local", guess, text)
+        intent = await self._aclassify_text(text)
+        return self._record_classification(input_format, intent, thread_id, "llm", guess, text)
+
+    async def _aclassify_text(self, text: str) -> str:
+        # Prompts are built in a worker thread: fit may count tokens over the network
+        system_prompt, user_prompt = await asyncio.to_thread(self._build_intent_prompts, text)
+        return await self.llm.agenerate_response(system_prompt, user_prompt, profile="classify")
+
+    def plan_fused(self, raw_input, mime_type: str = None):
+        """
+        Returns (input_format, local_guess) if the input can be classified by the extraction call
+        itself (fused mode), else None. That requires a format that fixes the route on its own
+        (Email, JSON) and an unsure local model; a confident local guess costs no LLM call anyway.
+        """
+        input_format = self._detect_format(raw_input, mime_type)
+        if input_format not in ("Email", "JSON"):
+            return None
+        guess = self.local.predict(self._intent_text(raw_input, input_format))
+        if self.local.is_confident(*guess):
+            return None
+        return input_format, guess
+
+    def record_fused(self, input_format: str, intent: str, thread_id: str, guess, raw_input):
+        """
+        Logs an intent that came back from a fused extraction call. Returns (format, intent, thread_id).
+        """
+        return self._record_classification(input_format, intent, thread_id, "fused", guess, self._intent_text(raw_input, input_format))
+
+    def classify_batch(self, raw_inputs: list, thread_ids: list = None, max_batch_size: int = 32):
+        """
+        Classifies many inputs with one LLM call per packed batch instead of one per input.
+        Returns a list of (format, intent, thread_id) in input order, like classify.
+        """
+        formats = [self._detect_format(raw_input) for raw_input in raw_inputs]
+        raw_inputs = [self._intent_text(raw_input, input_format) for raw_input, input_format in zip(raw_inputs, formats)]
+        guesses = [self.local.predict(raw_input) for raw_input in raw_inputs]
+        local = {i: guess[0] for i, guess in enumerate(guesses) if self.local.is_confident(*guess)}
+        fitted = {i: self.prompts.fit(raw_inputs[i], 'classify') for i in range(len(raw_inputs)) if i not in local}
+        intents = {}
+        for batch in self._pack_batches(fitted, max_batch_size):
+            intents.update(self._classify_packed(fitted, batch))
+
+        # Slots the batch answer didn't cover fall back to one call each (a batch the backend failed on stays Unknown)
+        for i in fitted:
+            if i not in intents:
+                system_prompt, user_prompt = self._build_intent_prompts(raw_inputs[i])
+                intents[i] = self.llm.generate_response(system_prompt, user_prompt, profile="classify")
+        return self._record_batch(raw_inputs, formats, local, intents, guesses, thread_ids)
+
+    async def aclassify_batch(self, raw_inputs: list, thread_ids: list = None, max_batch_size: int = 32):
+        """
+        Async variant of classify_batch; packed batches and fallbacks run concurrently.
+        """
+        formats = [self._detect_format(raw_input) for raw_input in raw_inputs]
+        raw_inputs = [self._intent_text(raw_input, input_format) for raw_input, input_format in zip(raw_inputs, formats)]
+        guesses = [self.local.predict(raw_input) for raw_input in raw_inputs]
+        local = {i: guess[0] for i, guess in enumerate(guesses) if self.local.is_confident(*guess)}
+        unsure = [i for i in range(len(raw_inputs)) if i not in local]
+        fitted = dict(zip(unsure, await asyncio.gather(*(asyncio.to_thread(self.prompts.fit, raw_inputs[i], 'classify') for i in unsure))))
+        intents = {}
+        for result in await asyncio.gather(*(self._aclassify_packed(fitted, batch) for batch in self._pack_batches(fitted, max_batch_size))):
+            intents.update(result)
+
+        missing = [i for i in fitted if i not in intents]
+        fallbacks = await asyncio.gather(*(self._aclassify_text(raw_inputs[i]) for i in missing))
+        intents.update(zip(missing, fallbacks))
+        return self._record_batch(raw_inputs, formats, local, intents, guesses, thread_ids)
+
+    def _pack_batches(self, fitted: dict, max_batch_size: int) -> list:
+        """
+        Greedily groups document indexes so each packed prompt stays within the classify_batch budget.
+        """
+        budget = self.prompts.budget_for("classify_batch")
+        batches, batch, used = [], [], 0
+        for i, text in fitted.items():
+            cost = local_token_estimate(text) + self.slot_overhead_tokens
+            if batch and (used + cost > budget or len(batch) >= max_batch_size):
+                batches.append(batch)
+                batch, used = [], 0
+            batch.append(i)
+            used += cost
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _classify_packed(self, fitted: dict, batch: list) -> dict:
+        if len(batch) == 1:
+            return {} # A lone document is cheaper as a plain classify call
+        system_prompt, user_prompt = self._build_batch_prompts(fitted, batch)
+        try:
+            parsed = self.llm.generate_structured(system_prompt, user_prompt, self.batch_schema, profile="classify_batch", raise_errors=True)
+        except Exception:
+            return dict.fromkeys(batch) # Backend error: splitting or single calls would only repeat it
+        if parsed is None:
+            # Unparseable or truncated answer: split the batch in half and retry each part
+            half = len(batch) // 2
+            return {**self._classify_packed(fitted, batch[:half]), **self._classify_packed(fitted, batch[half:])}
+        return self._parse_batch(parsed, batch)
+
+    async def _aclassify_packed(self, fitted: dict, batch: list) -> dict:
+        if len(batch) == 1:
+            return {}
+        system_prompt, user_prompt = self._build_batch_prompts(fitted, batch)
+        try:
+            parsed = await self.llm.agenerate_structured(system_prompt, user_prompt, self.batch_schema, profile="classify_batch", raise_errors=True)
+        except Exception:
+            return dict.fromkeys(batch)
+        if parsed is None:
+            half = len(batch) // 2
+            left, right = await asyncio.gather(self._aclassify_packed(fitted, batch[:half]), self._aclassify_packed(fitted, batch[half:]))
+            return {**left, **right}
+        return self._parse_batch(parsed, batch)
+
+    def _build_batch_prompts(self, fitted: dict, batch: list):
+        system_prompt = f"""You are an intelligent classification agent. Classify each numbered document by its primary intent.
+        Possible intents include: {", ".join(self.intents)} (RFQ means Request for Quote).
+        Return one result per document, using the document's number as its slot."""
+
+        documents = "\n\n".join(f"[Document {slot}]\n{fitted[i]}" for slot, i in enumerate(batch, start=1))
+        user_prompt = f"Classify the following {len(batch)} documents.\n\nDocuments:\n{documents}"
+        return system_prompt, user_prompt
+
+    def _parse_batch(self, parsed: dict, batch: list) -> dict:
+        """
+        Maps slot numbers back to document indexes, dropping slots that are out of range or unknown.
+        """
+        intents = {}
+        for item in parsed.get("results") or []:
+            if not isinstance(item, dict):
+                continue
+            slot, intent = item.get("slot"), item.get("intent")
+            if isinstance(slot, int) and 1 <= slot <= len(batch) and intent in self.intents:
+                intents[batch[slot - 1]] = intent
+        return intents
+
+    def _record_batch(self, raw_inputs: list, formats: list, local: dict, intents: dict, guesses: list, thread_ids: list = None) -> list:
+        thread_ids = thread_ids or [None] * len(formats)
+        return [
+            self._record_classification(input_format, local[i], thread_ids[i], "local", guesses[i], raw_inputs[i]) if i in local
+            else self._record_classification(input_format, intents.get(i), thread_ids[i], "llm", guesses[i], raw_inputs[i])
+            for i, input_format in enumerate(formats)
+        ]
+
+    def _build_intent_prompts(self, raw_input: str):
         system_prompt = f"""You are an intelligent classification agent. Your task is to accurately identify the intent of the user's input.
         Possible intents include: Invoice, RFQ (Request for Quote), Complaint, Regulation, General Inquiry, Other.
         Respond ONLY with the identified intent word."""
 
-        user_prompt = f"Given the following content, what is its primary intent?\n\nContent: {raw_input[:1000]}..." # Limit input length for LLM
+        user_prompt = f"Given the following content, what is its primary intent?\n\nContent: {self.prompts.fit(raw_input, 'classify')}" # Limit input length for LLM
+        return system_prompt, user_prompt
 
-        intent = self.llm.generate_response(system_prompt, user_prompt)
-        
+    def _record_classification(self, input_format: str, intent: str, thread_id: str = None, decided_by: str = "llm", guess=(None, None), raw_input: str = None):
         if intent:
             intent = intent.strip().replace('.', '') # Clean up LLM output
+        self.decisions[decided_by] += 1
 
-        # Step 3: Log in Shared Memory
+        # Keep the text (by hash) so LLM-labelled examples can train the local model later; only
+        # the prefix the local model featurizes, and nothing for inputs it already decided
+        content_hash = None
+        if decided_by in ("llm", "fused") and isinstance(raw_input, str):
+            content_hash = self.memory.store_content(raw_input[:self.local.max_chars])
         thread_id = self.memory.log_interaction(
             source="ClassifierAgent",
             input_type=input_format,
             intent=intent if intent else "Unknown",
-            extracted_values={"format": input_format, "intent": intent},
+            extracted_values={
+                "format": input_format, "intent": intent, "decided_by": decided_by,
+                "local_intent": guess[0], "local_confidence": guess[1], "content_hash": content_hash,
+            },
             thread_id=thread_id
         )
         
-        print(f"Classifier: Detected Format: {input_format}, Intent: {intent}")
+        print(f"Classifier: Detected Format: {input_format}, Intent: {intent} (decided by {decided_by})")
         return input_format, intent, thread_id
 
-    def _detect_format(self, raw_input: str) -> str:
+    def _intent_text(self, raw_input, input_format: str = None) -> str:
         """
-        Heuristically detects the input format (PDF, JSON, Email, Text).
-        This is a pre-processing step before LLM classification for efficiency.
+        Text the intent is judged on: the input itself (emails and plain text without quoted
+        history, signatures and disclaimers), the first page of a PDF DocumentHandle (parsed once
+        and reused by PDFAgent), or the decoded prefix of other binary input.
         """
-        # Check for PDF by trying to read it (basic check)
-        # This is a very basic check. A robust system would require file upload handling
-        # For this exercise, assume raw_input might be a path to a PDF file or its content.
-        # If it's the content, then it's trickier to detect without magic bytes.
-        # For simplicity, we'll assume the input is the actual content for now,
-        # but a real system would take a file object/path.
-        
-        # If raw_input is a path:
-        if isinstance(raw_input, str) and os.path.exists(raw_input) and raw_input.lower().endswith('.pdf'):
+        if isinstance(raw_input, str):
+            return self.normalizer.normalize(raw_input) if input_format in ("Email", "Text") else raw_input
+        if isinstance(raw_input, DocumentHandle) and input_format == "PDF":
             try:
-                reader = PdfReader(raw_input)
-                if len(reader.pages) > 0:
-                    return "PDF"
+                return raw_input.page_text(0)
             except Exception:
-                pass # Not a valid PDF or corrupted
+                pass # Unreadable PDF; PDFAgent reports the error
+        return self.sniffer.sample(raw_input).text
 
-        # Check for JSON structure
-        try:
-            json.loads(raw_input)
-            return "JSON"
-        except json.JSONDecodeError:
-            pass
-
-        # Check for common email headers (From:, To:, Subject:)
-        if re.search(r"^(From:|To:|Subject:|Date:)", raw_input, re.MULTILINE | re.IGNORECASE):
-            return "Email"
-        
-        # Default to Text if none of the above
-        return "Text"
\ No newline at end of file
+    def _detect_format(self, raw_input, mime_type: str = None) -> str:
+        """
+        Heuristically detects the input format (PDF, JSON, Email, Text).
+        This is a pre-processing step before LLM classification for efficiency.
+        Only a bounded prefix is inspected (see format_sniffer.py); the downstream agent
+        does the full parse, so large payloads are not parsed twice.
+        """
+        return self.sniffer.sniff(raw_input, mime_type)
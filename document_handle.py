@@ -0,0 +1,258 @@
+import io
+import os
+import mmap
+import hashlib
+from pdf_text_cache import pdf_text_cache
+
+class BufferReader(io.RawIOBase):
+    """
+    Read-only, seekable stream over a memoryview, so a PdfReader can parse a bytearray,
+    memoryview or mmap in place (io.BytesIO would copy anything that isn't bytes).
+    """
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast("B")
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        count = max(0, min(len(b), len(self._view) - self._position))
+        b[:count] = self._view[self._position:self._position + count]
+        self._position += count
+        return count
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        else:
+            position = len(self._view) + offset
+        if position < 0:
+            raise ValueError(f"negative seek position {position}")
+        self._position = position
+        return position
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self):
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+class DocumentHandle:
+    """
+    Carries one binary input (file path, bytes, bytearray, memoryview, mmap or binary file
+    object) through the pipeline so it is read, hashed and parsed at most once per request.
+    The document is never copied: paths and real files are memory-mapped, buffers are viewed
+    in place and in-memory streams expose their buffer. The sha256, PdfReader and per-page
+    text are computed on first use and shared by the classifier and agents. Page counts and
+    page text also go through the persistent PDF text cache, so a repeat document (same
+    bytes) is never parsed.
+    """
+    def __init__(self, source, mime_type: str = None, text_cache=None):
+        self.source = os.fspath(source) if isinstance(source, os.PathLike) else source
+        self.mime_type = mime_type
+        self.text_cache = text_cache or pdf_text_cache
+        self._page_count = None
+        self._data = None
+        self._decoded = None
+        self._sha256 = None
+        self._reader = None
+        self._stream = None
+        self._mapped = None # mmap this handle opened itself (closed by close())
+        self._page_texts = {} # page index -> extracted text
+        self._layout_texts = {} # page index -> layout-mode text (column positions kept)
+
+    @staticmethod
+    def path_of(raw_input):
+        """
+        The input as a file path to read, or None. Inline text is never read from disk: only
+        os.PathLike objects (pathlib.Path) and strings naming an existing .pdf file are paths.
+        """
+        if isinstance(raw_input, os.PathLike):
+            return os.fspath(raw_input)
+        if (isinstance(raw_input, str) and len(raw_input) < 4096 and "\n" not in raw_input
+                and raw_input.lower().endswith(".pdf") and os.path.isfile(raw_input)):
+            return raw_input
+        return None
+
+    @staticmethod
+    def accepts(raw_input) -> bool:
+        """
+        True for inputs that are documents rather than inline text: bytes, binary streams and file paths.
+        """
+        if isinstance(raw_input, (DocumentHandle, bytes, bytearray, memoryview, mmap.mmap)):
+            return True
+        if isinstance(raw_input, (str, os.PathLike)):
+            return DocumentHandle.path_of(raw_input) is not None
+        return hasattr(raw_input, "read")
+
+    @classmethod
+    def wrap(cls, raw_input, mime_type: str = None):
+        if isinstance(raw_input, DocumentHandle):
+            return raw_input
+        return cls(raw_input, mime_type)
+
+    @property
+    def path(self):
+        return self.source if isinstance(self.source, str) else None
+
+    @property
+    def data(self):
+        """
+        The whole document as a read-only bytes-like object (bytes, memoryview or mmap),
+        obtained once and without copying. Streams are left at their original position.
+        """
+        if self._data is None:
+            source = self.source
+            if isinstance(source, str):
+                with open(source, "rb") as f:
+                    self._data = self._map(f) or f.read() # read() only for empty or unmappable files
+            elif isinstance(source, bytes):
+                self._data = source
+            elif isinstance(source, (bytearray, memoryview, mmap.mmap)):
+                self._data = memoryview(source).cast("B")
+            else:
+                self._data = self._stream_data(source)
+        return self._data
+
+    def _stream_data(self, source):
+        position = source.tell() if hasattr(source, "tell") else 0
+        if isinstance(source, io.BytesIO):
+            value = source.getvalue() # Returns BytesIO's own buffer, not a copy
+            return value if position == 0 else memoryview(value)[position:]
+        if position == 0:
+            mapped = self._map(source)
+            if mapped is not None:
+                return mapped
+        # Non-seekable or partly consumed streams have to be read
+        data = source.read()
+        if hasattr(source, "seek"):
+            source.seek(position)
+        return data
+
+    def _map(self, f):
+        """
+        Memory-maps a real file read-only, or returns None (empty file, pipe, socket, no fileno).
+        """
+        try:
+            self._mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+            return None
+        return self._mapped
+
+    def head(self, size: int) -> bytes:
+        """
+        The first `size` bytes, without reading the rest of a file that isn't loaded yet.
+        """
+        if self._data is None and isinstance(self.source, str):
+            with open(self.source, "rb") as f:
+                return f.read(size)
+        return bytes(self.data[:size])
+
+    @property
+    def decoded(self) -> str:
+        """
+        The document as UTF-8 text, for the text agents (Email, JSON).
+        """
+        if self._decoded is None:
+            self._decoded = str(self.data, "utf-8", "replace")
+        return self._decoded
+
+    @property
+    def sha256(self) -> str:
+        if self._sha256 is None:
+            self._sha256 = hashlib.sha256(self.data).hexdigest()
+        return self._sha256
+
+    @property
+    def reader(self):
+        """
+        A PdfReader over the document's bytes, constructed once and parsing them in place.
+        """
+        if self._reader is None:
+            from pypdf import PdfReader # Deferred: only PDF inputs need pypdf
+            data = self.data
+            # BytesIO shares a bytes object's memory; anything else is read through a view
+            self._stream = io.BytesIO(data) if isinstance(data, bytes) else io.BufferedReader(BufferReader(data))
+            self._reader = PdfReader(self._stream)
+        return self._reader
+
+    @property
+    def page_count(self) -> int:
+        if self._page_count is None:
+            count = self.text_cache.page_count(self.sha256) if self.text_cache.enabled else None
+            if count is None:
+                count = len(self.reader.pages)
+                if self.text_cache.enabled:
+                    self.text_cache.set_page_count(self.sha256, count)
+            self._page_count = count
+        return self._page_count
+
+    def page_text(self, index: int) -> str:
+        """
+        Text of page `index`, extracted once (and only if the persistent cache doesn't have it).
+        """
+        text = self._page_texts.get(index)
+        if text is None:
+            if self.text_cache.enabled:
+                text = self.text_cache.get_page(self.sha256, index)
+            if text is None:
+                text = self.reader.pages[index].extract_text() or ""
+                if self.text_cache.enabled:
+                    self.text_cache.put_page(self.sha256, index, text)
+            self._page_texts[index] = text
+        return text
+
+    def page_layout_text(self, index: int) -> str:
+        """
+        Layout-mode text of page `index` (glyphs kept near their horizontal positions, for tables),
+        extracted once per handle. Not persisted: the table extractor caches its results instead.
+        """
+        text = self._layout_texts.get(index)
+        if text is None:
+            text = self.reader.pages[index].extract_text(extraction_mode="layout") or ""
+            self._layout_texts[index] = text
+        return text
+
+    def cached_page_texts(self) -> dict:
+        """
+        {page_index: text} for pages already available without extraction.
+        """
+        return dict(self._page_texts)
+
+    def cache_page_texts(self, texts: dict):
+        """
+        Stores {page_index: text} extracted elsewhere (e.g. by a process pool).
+        """
+        self._page_texts.update(texts)
+        if self.text_cache.enabled:
+            self.text_cache.put_pages(self.sha256, texts)
+
+    def close(self):
+        """
+        Drops the reader and buffer views and unmaps a file the handle mapped itself. Optional:
+        everything is released when the handle is garbage collected anyway.
+        """
+        self._reader = None
+        if self._stream is not None:
+            self._stream.close() # Releases its view now; the reader may live on in a reference cycle
+            self._stream = None
+        if isinstance(self._data, memoryview):
+            self._data.release()
+        self._data = None
+        if self._mapped is not None:
+            self._mapped.close()
+            self._mapped = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
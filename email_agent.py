@@ -1,34 +1,183 @@
 from llm_wrapper import llm_wrapper
 from memory_module import shared_memory
-import json
+from prompt_builder import PromptBuilder
+from classifier_agent import FUSED_INTENT_INSTRUCTION
+from local_classifier import INTENTS
+from email_normalizer import email_normalizer
+from email.parser import Parser
+from email import policy
+import textwrap
+import asyncio
 
 class EmailAgent:
-    def __init__(self):
-        self.llm = llm_wrapper
-        self.memory = shared_memory
+    # Keys the extraction prompt asks for; streaming stops once all of them have arrived
+    output_fields = ['sender_name', 'sender_email', 'subject', 'extracted_intent', 'urgency', 'summary']
 
-    def process_email(self, email_content: str, thread_id: str):
+    # Gemini response_schema for native structured output
+    response_schema = {
+        "type": "OBJECT",
+        "properties": {
+            "sender_name": {"type": "STRING"},
+            "sender_email": {"type": "STRING"},
+            "subject": {"type": "STRING"},
+            "extracted_intent": {"type": "STRING"},
+            "urgency": {"type": "STRING", "enum": ["Low", "Medium", "High"]},
+            "summary": {"type": "STRING"},
+        },
+        "required": output_fields,
+    }
+
+    # Fused classify+extract: the same extraction plus the document's intent
+    fused_fields = output_fields + ['document_intent']
+    fused_schema = dict(
+        response_schema,
+        properties=dict(response_schema["properties"], document_intent={"type": "STRING", "enum": INTENTS}),
+        required=fused_fields,
+    )
+
+    # Fields read from the RFC 5322 headers when the content has them; the LLM is asked for the rest.
+    # An empty list sends whole emails to the LLM as before.
+    header_fields = ['sender_name', 'sender_email', 'subject']
+
+    def __init__(self, llm=None, memory=None, normalizer=None):
+        self.llm = llm or llm_wrapper # Defaults to the global wrapper; pass one to use another backend
+        self.memory = memory or shared_memory
+        self.prompts = PromptBuilder(self.llm) # Fits content to the per-task token budget
+        self._schemas = {} # Requested fields -> response_schema
+        self.normalizer = normalizer or email_normalizer # Drops quoted replies, signatures and disclaimers
+
+    def process_email(self, email_content: str, thread_id: str, on_field=None, on_intent=None):
         """
         Accepts email content, extracts sender, intent, urgency, and formats for CRM.
+        Sender and subject come from the parsed headers when present; the LLM only reads the body.
+        If on_field is given, the response is streamed and on_field(key, value) is called
+        as soon as each field is complete.
+        If on_intent is given (fused mode), the same call also returns 'document_intent' and
+        on_intent(intent) runs before logging; it returns the thread_id to log under.
+        """
+        headers, body = self._parse_headers(email_content)
+        fields, schema = self._request_shape(on_intent, headers)
+        system_prompt, user_prompt = self._build_prompts(email_content, fused=on_intent is not None, headers=headers, body=body, fields=fields)
+        if on_field is not None:
+            for key, value in headers.items():
+                on_field(key, value) # Known before the LLM is called
+            extracted_email_info = self.llm.generate_response_stream(system_prompt, user_prompt, fields, on_field, schema=schema, profile="email_extract")
+        else:
+            extracted_email_info = self.llm.generate_structured(system_prompt, user_prompt, schema, profile="email_extract")
+        if on_intent is not None:
+            thread_id = on_intent((extracted_email_info or {}).pop('document_intent', None))
+        return self._finalize(extracted_email_info, thread_id, headers)
+
+    async def aprocess_email(self, email_content: str, thread_id: str, on_field=None, on_intent=None):
+        """
+        Async variant of process_email; awaits the LLM instead of blocking on it.
+        """
+        headers, body = self._parse_headers(email_content)
+        fields, schema = self._request_shape(on_intent, headers)
+        system_prompt, user_prompt = await asyncio.to_thread( # fit may count tokens over the network
+            self._build_prompts, email_content, fused=on_intent is not None, headers=headers, body=body, fields=fields
+        )
+        if on_field is not None:
+            for key, value in headers.items():
+                on_field(key, value) # Known before the LLM is called
+            extracted_email_info = await self.llm.agenerate_response_stream(system_prompt, user_prompt, fields, on_field, schema=schema, profile="email_extract")
+        else:
+            extracted_email_info = await self.llm.agenerate_structured(system_prompt, user_prompt, schema, profile="email_extract")
+        if on_intent is not None:
+            thread_id = on_intent((extracted_email_info or {}).pop('document_intent', None))
+        return self._finalize(extracted_email_info, thread_id, headers)
+
+    def _parse_headers(self, email_content: str):
+        """
+        Returns (header_values, body). header_values prefills sender_email, subject and (when the
+        From header has a display name) sender_name; it is empty, and body is None, when the
+        content doesn't start with RFC 5322 headers including a parseable From.
+        """
+        if not self.header_fields:
+            return {}, None
+        text = textwrap.dedent(email_content).lstrip("\n") # Pasted or inline emails are often indented
+        try:
+            message = Parser(policy=policy.default).parsestr(text)
+            sender = message['From']
+            addresses = sender.addresses if sender is not None else ()
+        except (ValueError, TypeError, IndexError) as e:
+            print(f"Email Agent: Could not parse headers ({e}); extracting them with the LLM")
+            return {}, None
+        if not addresses or "@" not in addresses[0].addr_spec:
+            return {}, None
+
+        headers = {'sender_email': addresses[0].addr_spec}
+        if addresses[0].display_name:
+            headers['sender_name'] = addresses[0].display_name
+        headers['subject'] = str(message['Subject']).strip() if message['Subject'] is not None else "N/A"
+        return {field: value for field, value in headers.items() if field in self.header_fields}, self._body(message)
+
+    def _body(self, message) -> str:
+        # Prefer the plain-text part of a MIME message; get_content() undoes transfer encodings
+        part = message.get_body(preferencelist=('plain', 'html')) if message.is_multipart() else message
+        if part is None:
+            return ""
+        try:
+            return part.get_content()
+        except (KeyError, LookupError, ValueError):
+            return str(part.get_payload())
+
+    def _request_shape(self, on_intent, headers: dict = None):
         """
+        (fields, response_schema) for the fields the LLM still has to extract.
+        """
+        fields = [field for field in self.output_fields if field not in (headers or {})]
+        if on_intent is not None:
+            fields.append('document_intent')
+        key = tuple(fields)
+        if key not in self._schemas:
+            properties = self.fused_schema["properties"]
+            self._schemas[key] = {"type": "OBJECT", "properties": {field: properties[field] for field in fields}, "required": fields}
+        return fields, self._schemas[key]
+
+    def _build_prompts(self, email_content: str, fused: bool = False, headers: dict = None, body: str = None, fields: list = None):
+        if headers:
+            return self._build_body_prompts(headers, body, fused, fields)
         system_prompt = """You are an email processing agent. Your task is to extract key information from the provided email content.
         Extract the sender's name and email, the email's subject, the primary intent (e.g., RFQ, Complaint, Inquiry), and the urgency (Low, Medium, High).
         Format the output as a JSON object with the following keys: 'sender_name', 'sender_email', 'subject', 'extracted_intent', 'urgency', 'summary'.
         For 'summary', provide a concise one-paragraph summary of the email's main content.
         If any field is not explicitly found, use "N/A" for strings or 0 for numbers.
         """
-        user_prompt = f"Process the following email:\n\n{email_content}"
+        if fused:
+            system_prompt += FUSED_INTENT_INSTRUCTION
+        user_prompt = f"Process the following email:\n\n{self.prompts.fit(self._normalize(email_content), 'email_extract')}"
+        return system_prompt, user_prompt
 
-        extracted_email_info_str = self.llm.generate_response(system_prompt, user_prompt, json_mode=True)
+    def _build_body_prompts(self, headers: dict, body: str, fused: bool, fields: list):
+        # Headers are already parsed: a shorter prompt over the subject and body only
+        keys = ", ".join(f"'{field}'" for field in fields if field != 'document_intent')
+        system_prompt = f"""You are an email processing agent. The email's headers were already parsed; from its subject and body extract
+        the primary intent (e.g., RFQ, Complaint, Inquiry), the urgency (Low, Medium, High) and a concise one-paragraph 'summary'.
+        Return a JSON object with the keys: {keys}.
+        """
+        if 'sender_name' in fields:
+            system_prompt += "For 'sender_name', use the name the sender signs with, or \"N/A\".\n"
+        if fused:
+            system_prompt += FUSED_INTENT_INSTRUCTION
+        user_prompt = f"Process the following email:\n\nSubject: {headers['subject']}\n\n{self.prompts.fit(self._normalize(body.strip()), 'email_extract')}"
+        return system_prompt, user_prompt
 
-        if extracted_email_info_str:
-            try:
-                extracted_email_info = json.loads(extracted_email_info_str)
-            except json.JSONDecodeError as e:
-                print(f"Email Agent: LLM returned invalid JSON: {e}")
-                extracted_email_info = {"status": "error", "message": "LLM output invalid JSON"}
-        else:
-            extracted_email_info = {"status": "error", "message": "LLM extraction failed"}
+    def _normalize(self, text: str) -> str:
+        text, stats = self.normalizer.normalize_with_stats(text)
+        if stats["bytes_saved"]:
+            print(f"Email Agent: Normalized email, removed {stats['bytes_saved']} bytes (~{stats['tokens_saved']} tokens)")
+        return text
+
+    def _finalize(self, extracted_email_info: dict, thread_id: str, headers: dict = None):
+        if not extracted_email_info:
+            # The parsed header values are still exact
+            extracted_email_info = {"status": "error", "message": "LLM extraction failed", **(headers or {})}
+        elif headers:
+            # Parsed header values are exact; keep the output_fields order
+            merged = {field: headers.get(field, extracted_email_info.get(field)) for field in self.output_fields}
+            merged.update((key, value) for key, value in extracted_email_info.items() if key not in merged)
+            extracted_email_info = merged
 
         # Basic validation/cleanup (optional, LLM should handle most)
         extracted_email_info['extracted_intent'] = extracted_email_info.get('extracted_intent', 'Unknown').replace('.', '')
@@ -43,4 +192,4 @@ class EmailAgent:
         )
         
         print(f"Email Agent: Processed email from {extracted_email_info.get('sender_email')}")
-        return extracted_email_info
\ No newline at end of file
+        return extracted_email_info
@@ -0,0 +1,151 @@
+import os
+import re
+import threading
+from prompt_builder import local_token_estimate
+
+# Start of quoted history in a top-posted reply; everything from here on is dropped
+REPLY_HEADER_PATTERN = re.compile(
+    r"^[ \t]*(?:"
+    r"On\b[^\n]{0,200}?(?:\n[^\n]{0,200}?)?\bwrote:[ \t]*$" # Gmail / Apple Mail, sometimes wrapped onto two lines
+    r"|-{2,}[ \t]*Original Message[ \t]*-{2,}" # Outlook, older clients
+    r"|From:[^\n]*\n(?:[^\n]*\n){0,3}?[ \t]*Sent:[^\n]*$" # Outlook header block
+    r"|_{20,}[ \t]*$" # Outlook separator rule
+    r")",
+    re.IGNORECASE | re.MULTILINE
+)
+HEADER_BLOCK_PATTERN = re.compile(r"\A(?:[A-Za-z][\w-]*:[^\n]*\n(?:[ \t][^\n]*\n)*)+\n") # RFC 5322 headers, kept as-is
+QUOTE_LINE_PATTERN = re.compile(r"^[ \t]*>")
+SIGNATURE_DELIMITER_PATTERN = re.compile(r"^-- ?$", re.MULTILINE) # RFC 3676 "-- " line
+MOBILE_FOOTER_PATTERN = re.compile(r"^[ \t]*(?:sent from my \w+|get outlook for \w+)", re.IGNORECASE)
+SIGNOFF_PATTERN = re.compile(
+    r"^[ \t]*(?:(?:kind|best|warm|many)[ \t]+)?(?:regards|thanks|thank you|sincerely|cheers|best)[ \t]*[,.!]?[ \t]*$",
+    re.IGNORECASE
+)
+# Lines that are message body, not signature: list items, amounts, or prose (several lowercase words)
+LIST_ITEM_PATTERN = re.compile(r"^[ \t]*(?:\d+[.)]|[-*•])[ \t]+")
+AMOUNT_PATTERN = re.compile(r"[$€£¥][ \t]?\d|\d[\d,.]*[ \t]?(?:EUR|USD|GBP|CHF)\b|\b(?:EUR|USD|GBP|CHF)[ \t]?\d")
+LOWERCASE_WORD_PATTERN = re.compile(r"(?<![\w@./-])[a-z]{2,}\b")
+
+# Phrases that only legal boilerplate uses, and words it shares with ordinary business mail
+DISCLAIMER_PHRASE_PATTERN = re.compile(
+    r"intended (?:solely |only )?for the (?:use of the )?(?:named )?(?:addressee|recipient|individual)|intended recipient"
+    r"|received this (?:e-?mail|message|communication) in error|notify the sender",
+    re.IGNORECASE
+)
+DISCLAIMER_WORD_PATTERN = re.compile(
+    r"confidential|privileged|disclaimer|virus|unsubscribe|legally binding|dissemination",
+    re.IGNORECASE
+)
+
+class EmailNormalizer:
+    """
+    Strips what an extraction or classification prompt doesn't need from an email: quoted
+    history (">" lines and everything after an "On ... wrote:" / Outlook reply header), the
+    signature (after a "-- " line, or past a couple of lines after a closing sign-off), mobile
+    footers and trailing legal disclaimer paragraphs. Sign-offs and disclaimers are only looked
+    for at the end of the message, below real body content, so a "Thanks!" opening line or a
+    paragraph about a regulation is never cut. One pass of precompiled regexes; nothing is
+    removed when it would leave the message empty (e.g. a bare forward of quoted text).
+    """
+    def __init__(self, enabled: bool = True, signoff_keep_lines: int = 2, signoff_window: int = 10,
+                 disclaimer_min_hits: int = 2, disclaimer_min_chars: int = 250, min_body_chars: int = 20):
+        self.enabled = enabled
+        self.signoff_keep_lines = signoff_keep_lines # Name (and title) under "Regards," are kept
+        self.signoff_window = signoff_window # A sign-off must be within this many non-empty lines of the end
+        self.disclaimer_min_hits = disclaimer_min_hits # Distinct legal words/phrases that mark a paragraph
+        self.disclaimer_min_chars = disclaimer_min_chars # Without a boilerplate phrase, only this long is boilerplate
+        self.min_body_chars = min_body_chars # Content needed above a sign-off or disclaimer before it is cut
+        self.signature_max_words = 3 # Lowercase words a signature line may have (prose has more)
+        self.messages = 0
+        self.bytes_saved = 0
+        self.tokens_saved = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(enabled=os.getenv("EMAIL_NORMALIZER", "1") == "1")
+
+    def normalize(self, text: str) -> str:
+        return self.normalize_with_stats(text)[0]
+
+    def normalize_with_stats(self, text: str):
+        """
+        Returns (normalized_text, stats) where stats has bytes/tokens before and after and saved.
+        """
+        normalized = self._strip(text) if self.enabled and text else text
+        if not normalized.strip():
+            normalized = text
+        bytes_in, bytes_out = len(text.encode("utf-8")), len(normalized.encode("utf-8"))
+        tokens_in = local_token_estimate(text)
+        tokens_out = local_token_estimate(normalized) if normalized is not text else tokens_in
+        stats = {
+            "bytes_in": bytes_in, "bytes_out": bytes_out, "bytes_saved": bytes_in - bytes_out,
+            "tokens_in": tokens_in, "tokens_out": tokens_out, "tokens_saved": tokens_in - tokens_out,
+        }
+        with self._lock:
+            self.messages += 1
+            self.bytes_saved += stats["bytes_saved"]
+            self.tokens_saved += stats["tokens_saved"]
+        return normalized, stats
+
+    def _strip(self, text: str) -> str:
+        text = text.replace("\r\n", "\n")
+        headers = HEADER_BLOCK_PATTERN.match(text)
+        if headers:
+            body = self._strip(text[headers.end():])
+            return headers.group() + body if body else ""
+        text = self._cut_at(text, REPLY_HEADER_PATTERN)
+        text = self._cut_at(text, SIGNATURE_DELIMITER_PATTERN)
+        lines = [line for line in text.split("\n") if not QUOTE_LINE_PATTERN.match(line) and not MOBILE_FOOTER_PATTERN.match(line)]
+        paragraphs = [paragraph.strip("\n") for paragraph in re.split(r"\n[ \t]*\n", "\n".join(lines)) if paragraph.strip()]
+        while len(paragraphs) > 1 and self._is_disclaimer(paragraphs[-1]) and self._has_body(paragraphs[:-1]):
+            paragraphs.pop() # Trailing boilerplate only; a disclaimer-like paragraph inside the body stays
+        lines = self._trim_after_signoff("\n\n".join(paragraphs).split("\n"))
+        text = "\n".join(lines).strip("\n")
+        return "" if REPLY_HEADER_PATTERN.fullmatch(text.strip()) else text # Only the quoted part had content
+
+    def _cut_at(self, text: str, pattern) -> str:
+        # The first match with real content above it; a header block opening the message is skipped
+        for match in pattern.finditer(text):
+            if text[:match.start()].strip():
+                return text[:match.start()]
+        return text
+
+    def _has_body(self, lines: list) -> bool:
+        return sum(len(line.strip()) for line in lines) >= self.min_body_chars
+
+    def _trim_after_signoff(self, lines: list) -> list:
+        # The closing sign-off: the last one, near the end, with real content above it and only
+        # signature-like lines below it
+        tail = [i for i, line in enumerate(lines) if line.strip()][-self.signoff_window:]
+        for i in reversed(tail):
+            if SIGNOFF_PATTERN.match(lines[i]) and self._has_body(lines[:i]):
+                if not all(self._is_signature_line(line) for line in lines[i + 1:]):
+                    return lines # Body text follows (a list, amounts, sentences): not a closing sign-off
+                kept = 0
+                for j in range(i + 1, len(lines)):
+                    if lines[j].strip():
+                        kept += 1
+                        if kept > self.signoff_keep_lines:
+                            return lines[:j]
+                return lines
+        return lines
+
+    def _is_signature_line(self, line: str) -> bool:
+        if LIST_ITEM_PATTERN.match(line) or AMOUNT_PATTERN.search(line):
+            return False
+        return len(LOWERCASE_WORD_PATTERN.findall(line)) <= self.signature_max_words
+
+    def _is_disclaimer(self, paragraph: str) -> bool:
+        phrases = {match.lower() for match in DISCLAIMER_PHRASE_PATTERN.findall(paragraph)}
+        words = {match.lower() for match in DISCLAIMER_WORD_PATTERN.findall(paragraph)}
+        if len(phrases) + len(words) < self.disclaimer_min_hits:
+            return False
+        return bool(phrases) or len(paragraph) >= self.disclaimer_min_chars
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"messages": self.messages, "bytes_saved": self.bytes_saved, "tokens_saved": self.tokens_saved}
+
+# Global instance, shared by EmailAgent and ClassifierAgent
+email_normalizer = EmailNormalizer.from_env()
@@ -0,0 +1,157 @@
+import os
+import re
+import mmap
+from document_handle import DocumentHandle
+
+# Explicit content types win over anything sniffed from the data
+MIME_FORMATS = {
+    "application/pdf": "PDF",
+    "application/json": "JSON",
+    "application/x-ndjson": "JSON",
+    "application/ndjson": "JSON",
+    "application/jsonl": "JSON",
+    "message/rfc822": "Email",
+}
+
+EMAIL_HEADER_PATTERN = re.compile(r"^(From:|To:|Subject:|Date:)", re.MULTILINE | re.IGNORECASE)
+PDF_MAGIC = b"%PDF-"
+PDF_MAGIC_WINDOW = 1024 # The PDF header may follow a little junk at the start of the file
+# What may open a JSON array: a nested container or string, an empty array, or a literal or
+# number followed by "," or "]" (so "[ticket #4471] ..." or "[1] Introduction" stay text)
+JSON_ARRAY_START_PATTERN = re.compile(
+    r'\[\s*(?:[\[{"]|\](?:[ \t]*(?:\n|$)|\s*[,\]}])|(?:true|false|null|-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)\s*(?:,|\](?:[ \t]*(?:\n|$)|\s*[,\]}])))'
+)
+
+class Sample:
+    """
+    Bounded view of an input shared by the detectors. `head` (bytes) and `text` (str) cover
+    at most `prefix_size` bytes/characters and are computed on first access, so detectors
+    that decide early never read a file or decode a large payload.
+    """
+    def __init__(self, raw_input, mime_type: str = None, prefix_size: int = 4096):
+        self.raw_input = raw_input
+        self.mime_type = mime_type
+        self.prefix_size = prefix_size
+        self._head = None
+        self._text = None
+
+    @property
+    def path(self):
+        """
+        The input as a file path, or None; see DocumentHandle.path_of (other strings are content).
+        """
+        raw = self.raw_input
+        if isinstance(raw, DocumentHandle):
+            return raw.path
+        return DocumentHandle.path_of(raw)
+
+    @property
+    def head(self) -> bytes:
+        if self._head is None:
+            self._head = self._read_head()
+        return self._head
+
+    def _read_head(self) -> bytes:
+        raw = self.raw_input
+        if isinstance(raw, DocumentHandle):
+            return raw.head(self.prefix_size)
+        if isinstance(raw, (bytes, bytearray, memoryview, mmap.mmap)):
+            return bytes(raw[:self.prefix_size]) # Slices (or views) just the prefix
+        if isinstance(raw, (str, os.PathLike)):
+            path = self.path
+            if path is not None:
+                with open(path, "rb") as f:
+                    return f.read(self.prefix_size)
+            if isinstance(raw, str):
+                return raw[:self.prefix_size].encode("utf-8", "replace")[:self.prefix_size]
+            return b""
+        if hasattr(raw, "read") and hasattr(raw, "seek"):
+            # File-like: read the prefix and rewind so the downstream agent sees the whole stream
+            position = raw.tell()
+            data = raw.read(self.prefix_size)
+            raw.seek(position)
+            return data.encode("utf-8", "replace") if isinstance(data, str) else bytes(data)
+        return b""
+
+    @property
+    def text(self) -> str:
+        """
+        Text prefix for the text detectors. A path is matched as the string itself, like before.
+        """
+        if self._text is None:
+            if isinstance(self.raw_input, str):
+                self._text = self.raw_input[:self.prefix_size]
+            else:
+                self._text = self.head.decode("utf-8", "replace")
+            self._text = self._text.lstrip("﻿") # Byte order mark
+        return self._text
+
+def detect_mime_type(sample: Sample):
+    if not sample.mime_type:
+        return None
+    mime_type = sample.mime_type.split(";", 1)[0].strip().lower()
+    if mime_type.endswith("+json"):
+        return "JSON"
+    return MIME_FORMATS.get(mime_type)
+
+def detect_pdf_magic(sample: Sample):
+    if isinstance(sample.raw_input, str) and sample.path is None:
+        return None # Plain text can't be a PDF
+    return "PDF" if PDF_MAGIC in sample.head[:PDF_MAGIC_WINDOW] else None
+
+def detect_json_prefix(sample: Sample):
+    """
+    JSON objects, arrays and NDJSON, judged by their first tokens only. The downstream agent
+    parses (and validates) the payload once.
+    """
+    text = sample.text.lstrip()
+    if len(text) < 2:
+        return None
+    rest = text[1:].lstrip()
+    if text[0] == "{" and (not rest or rest[0] in '"}'):
+        return "JSON" # Covers NDJSON too: every line starts with an object
+    if text[0] == "[" and JSON_ARRAY_START_PATTERN.match(text):
+        return "JSON"
+    return None
+
+def detect_email_headers(sample: Sample):
+    return "Email" if EMAIL_HEADER_PATTERN.search(sample.text) else None
+
+# Ordered by cost: metadata, a few magic bytes, the first tokens, then a regex over the prefix
+DEFAULT_DETECTORS = [detect_mime_type, detect_pdf_magic, detect_json_prefix, detect_email_headers]
+
+class FormatSniffer:
+    """
+    Runs a chain of detectors (callables taking a Sample and returning a format or None)
+    in order and returns the first answer, or `default`.
+    """
+    def __init__(self, detectors=None, prefix_size: int = 4096, default: str = "Text"):
+        self.detectors = list(detectors if detectors is not None else DEFAULT_DETECTORS)
+        self.prefix_size = prefix_size
+        self.default = default
+
+    def register(self, detector, index: int = None):
+        """
+        Adds a detector; by default it runs last (most expensive).
+        """
+        if index is None:
+            self.detectors.append(detector)
+        else:
+            self.detectors.insert(index, detector)
+
+    def sample(self, raw_input, mime_type: str = None) -> Sample:
+        return Sample(raw_input, mime_type, self.prefix_size)
+
+    def sniff(self, raw_input, mime_type: str = None) -> str:
+        sample = self.sample(raw_input, mime_type)
+        for detector in self.detectors:
+            try:
+                detected = detector(sample)
+            except OSError:
+                detected = None # Unreadable file or stream; let cheaper-to-fail detectors continue
+            if detected:
+                return detected
+        return self.default
+
+# Global instance, shared by agents
+format_sniffer = FormatSniffer()
@@ -0,0 +1,73 @@
+import os
+import threading
+
+# Named generation settings per task. Every profile runs at temperature 0.0; "model" (optional)
+# overrides the wrapper's default model and can also be set with LLM_PROFILE_MODEL_<NAME>.
+GENERATION_PROFILES = {
+    # Fallback for callers that don't pick a profile; matches the original single config
+    "default": {"max_output_tokens": 2000},
+    # A single intent word: a tiny output cap and stop at the first newline for minimum latency
+    "classify": {"max_output_tokens": 10, "stop_sequences": ["\n"]},
+    # One {"slot", "intent"} pair (~15 tokens) per packed document
+    "classify_batch": {"max_output_tokens": 1024},
+    "email_extract": {"max_output_tokens": 800},
+    # Whole canonical invoice, line_items included: never below the original 2000 cap
+    "json_remap": {"max_output_tokens": 2000},
+    "pdf_extract": {"max_output_tokens": 500},
+}
+
+def get_profile(name: str) -> dict:
+    """
+    Returns the settings for profile `name`, with any model override from the environment.
+    """
+    if name not in GENERATION_PROFILES:
+        raise ValueError(f"Unknown generation profile: {name}")
+    profile = dict(GENERATION_PROFILES[name])
+    model = os.getenv(f"LLM_PROFILE_MODEL_{name.upper()}")
+    if model:
+        profile["model"] = model
+    return profile
+
+class ProfileStats:
+    """
+    Thread-safe per-profile counters for latency and token spend.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _entry(self, profile: str) -> dict:
+        # Caller holds the lock
+        entry = self._stats.get(profile)
+        if entry is None:
+            entry = {"calls": 0, "errors": 0, "cache_hits": 0, "latency_seconds": 0.0, "prompt_tokens": 0, "output_tokens": 0}
+            self._stats[profile] = entry
+        return entry
+
+    def record_call(self, profile: str, latency: float, prompt_tokens: int, output_tokens: int):
+        with self._lock:
+            entry = self._entry(profile)
+            entry["calls"] += 1
+            entry["latency_seconds"] += latency
+            entry["prompt_tokens"] += prompt_tokens
+            entry["output_tokens"] += output_tokens
+
+    def record_error(self, profile: str):
+        with self._lock:
+            self._entry(profile)["errors"] += 1
+
+    def record_cache_hit(self, profile: str):
+        with self._lock:
+            self._entry(profile)["cache_hits"] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            report = {}
+            for profile, entry in self._stats.items():
+                report[profile] = dict(entry)
+                report[profile]["avg_latency_seconds"] = entry["latency_seconds"] / entry["calls"] if entry["calls"] else 0.0
+            return report
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
@@ -0,0 +1,67 @@
+import json
+
+class IncrementalJSONParser:
+    """
+    Parses a JSON object as it streams in and reports each top-level field as soon
+    as its value is complete. Leading text such as a ```json fence is skipped.
+    """
+    def __init__(self):
+        self.buffer = ""
+        self.fields = {} # Completed top-level fields, in arrival order
+        self.complete = False # True once the closing brace of the object has been seen
+        self._pos = 0 # Next character of buffer to scan
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._member_start = None # Start of the current "key": value member at depth 1
+
+    def feed(self, chunk: str) -> list:
+        """
+        Adds a chunk of model output and returns a list of (key, value) pairs completed by it.
+        """
+        self.buffer += chunk
+        completed = []
+        buffer = self.buffer
+        i = self._pos
+        while i < len(buffer) and not self.complete:
+            ch = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif self._depth == 0:
+                if ch == "{": # Anything before the opening brace (fences, prose) is ignored
+                    self._depth = 1
+                    self._member_start = i + 1
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit(buffer[self._member_start:i], completed)
+                    self.complete = True
+            elif ch == "," and self._depth == 1:
+                self._emit(buffer[self._member_start:i], completed)
+                self._member_start = i + 1
+            i += 1
+        self._pos = i
+        return completed
+
+    def _emit(self, member: str, completed: list):
+        if not member.strip():
+            return
+        try:
+            parsed = json.loads("{" + member + "}")
+        except json.JSONDecodeError:
+            return # Malformed member; the caller falls back to parsing the full text
+        for key, value in parsed.items():
+            self.fields[key] = value
+            completed.append((key, value))
+
+    def has_keys(self, keys) -> bool:
+        return all(key in self.fields for key in keys)
@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import threading
+from memory_module import shared_memory
+from local_classifier import local_classifier, SEED_EXAMPLES, INTENTS
+
+class IntentTrainer:
+    """
+    Distills LLM classification decisions logged in SharedMemory into the local intent model.
+
+    harvest() collects (text, intent) pairs from ClassifierAgent entries the LLM decided, using
+    the memory's content store for the text. retrain() trains on seed + harvested examples and
+    hot-swaps the result into the LocalIntentClassifier shared with ClassifierAgent. start()
+    repeats that on a background thread; metrics() reports how much traffic skips the LLM.
+    """
+    def __init__(self, memory=None, classifier=None, llm=None, min_new_examples: int = 20):
+        self.memory = memory or shared_memory
+        self.classifier = classifier or local_classifier
+        self.llm = llm # Optional LLMWrapper; its classify profile latencies price the saved calls
+        self.min_new_examples = min_new_examples # Skip a refresh until this many new labels arrived
+        self.extra_examples = [] # Loaded from files (offline pipeline)
+        self.trained_on = 0 # Harvested examples in the installed model
+        self.last_trained_at = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_env(cls, memory=None, classifier=None, llm=None):
+        return cls(memory, classifier, llm, min_new_examples=int(os.getenv("INTENT_TRAINER_MIN_NEW_EXAMPLES", "20")))
+
+    def harvest(self) -> list:
+        """
+        Returns (text, intent) pairs labelled by the LLM, one per distinct content.
+        """
+        examples = {}
+        for _, entry in self.memory.iter_entries("ClassifierAgent"):
+            values = entry.get("extracted_values", {})
+            if values.get("decided_by") not in ("llm", "fused") or values.get("intent") not in INTENTS:
+                continue
+            text = self.memory.get_content(values.get("content_hash"))
+            if text is not None:
+                examples[values["content_hash"]] = (text, values["intent"]) # Latest label wins
+        return list(examples.values())
+
+    def retrain(self, force: bool = False) -> bool:
+        """
+        Trains a new model and installs it. Returns False if there were too few new examples.
+        """
+        harvested = self.harvest()
+        if not force and len(harvested) - self.trained_on < self.min_new_examples:
+            return False
+        # Train outside the classifier's lock; only the swap itself is atomic
+        model = self.classifier.train(SEED_EXAMPLES + self.extra_examples + harvested)
+        self.classifier.install(model)
+        self.trained_on = len(harvested)
+        self.last_trained_at = time.time()
+        print(f"IntentTrainer: installed model v{self.classifier.version} trained on {model['examples']} examples")
+        return True
+
+    def start(self, interval_seconds: float):
+        """
+        Refreshes the model every interval_seconds on a daemon thread.
+        """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.wait(interval_seconds):
+                try:
+                    self.retrain()
+                except Exception as e:
+                    print(f"IntentTrainer: refresh failed: {e}")
+
+        self._thread = threading.Thread(target=loop, name="intent-trainer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def export_examples(self, path: str) -> int:
+        """
+        Writes harvested examples as JSON lines ({"text", "intent"}) for offline training.
+        """
+        examples = self.harvest()
+        with open(path, "w", encoding="utf-8") as f:
+            for text, intent in examples:
+                f.write(json.dumps({"text": text, "intent": intent}) + "\n")
+        return len(examples)
+
+    def load_examples(self, path: str) -> int:
+        """
+        Adds examples from a JSON lines file (as written by export_examples) to every future retrain.
+        """
+        with open(path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        self.extra_examples.extend((row["text"], row["intent"]) for row in rows if row.get("intent") in INTENTS)
+        return len(rows)
+
+    def metrics(self) -> dict:
+        """
+        local_share: fraction of classifications decided without the LLM.
+        agreement_rate: how often the local model's guess matched the LLM on LLM-decided inputs.
+        latency_saved_seconds: local decisions times the average LLM time per classified document.
+        """
+        local = llm = agreed = compared = 0
+        for _, entry in self.memory.iter_entries("ClassifierAgent"):
+            values = entry.get("extracted_values", {})
+            if values.get("decided_by") == "local":
+                local += 1
+            elif values.get("decided_by") in ("llm", "fused"):
+                llm += 1
+                if values.get("local_intent") is not None and values.get("intent") in INTENTS:
+                    compared += 1
+                    agreed += values["local_intent"] == values["intent"]
+
+        # Average LLM time per LLM-decided document, counting single and packed batch calls
+        avg_latency = 0.0
+        if self.llm is not None and llm:
+            stats = self.llm.profile_stats.snapshot()
+            spent = sum(stats.get(profile, {}).get("latency_seconds", 0.0) for profile in ("classify", "classify_batch"))
+            avg_latency = spent / llm
+        return {
+            "model_version": self.classifier.version,
+            "trained_on": self.trained_on,
+            "last_trained_at": self.last_trained_at,
+            "local_decisions": local,
+            "llm_decisions": llm,
+            "local_share": local / (local + llm) if local + llm else 0.0,
+            "agreement_rate": agreed / compared if compared else None,
+            "latency_saved_seconds": local * avg_latency,
+        }
+
+    def log_metrics(self):
+        print(f"IntentTrainer metrics: {json.dumps(self.metrics())}")
@@ -1,67 +1,160 @@
 from llm_wrapper import llm_wrapper
 from memory_module import shared_memory
+from prompt_builder import PromptBuilder
+from classifier_agent import FUSED_INTENT_INSTRUCTION
+from local_classifier import INTENTS
 import json
+import asyncio
 
 class JSONAgent:
-    def __init__(self):
-        self.llm = llm_wrapper
-        self.memory = shared_memory
+    # Define a target schema (example for an Invoice)
+    # In a real system, this could be loaded from a configuration or dynamically determined.
+    target_schema = {
+        "invoice_number": None,
+        "customer_name": None,
+        "total_amount": None,
+        "currency": None,
+        "date_issued": None,
+        "line_items": [] # Example for nested data
+    }
 
-    def process_json(self, json_payload: str, thread_id: str):
+    # Gemini response_schema matching target_schema; fields are nullable so missing data stays detectable
+    response_schema = {
+        "type": "OBJECT",
+        "properties": {
+            "invoice_number": {"type": "STRING", "nullable": True},
+            "customer_name": {"type": "STRING", "nullable": True},
+            "total_amount": {"type": "NUMBER", "nullable": True},
+            "currency": {"type": "STRING", "nullable": True},
+            "date_issued": {"type": "STRING", "nullable": True},
+            "line_items": {
+                "type": "ARRAY",
+                "items": {
+                    "type": "OBJECT",
+                    "properties": {
+                        "description": {"type": "STRING"},
+                        "quantity": {"type": "NUMBER"},
+                        "unit_price": {"type": "NUMBER"},
+                    },
+                },
+            },
+        },
+        "required": list(target_schema),
+    }
+
+    # Fused classify+extract: the same remap plus the document's intent
+    fused_schema = dict(
+        response_schema,
+        properties=dict(response_schema["properties"], document_intent={"type": "STRING", "enum": INTENTS}),
+        required=list(target_schema) + ["document_intent"],
+    )
+
+    def __init__(self, llm=None, memory=None):
+        self.llm = llm or llm_wrapper # Defaults to the global wrapper; pass one to use another backend
+        self.memory = memory or shared_memory
+        self.prompts = PromptBuilder(self.llm) # Fits content to the per-task token budget
+
+    def process_json(self, json_payload: str, thread_id: str, on_intent=None, fallback=None):
         """
         Accepts JSON, extracts/reformats to a target schema, and flags anomalies.
+        If on_intent is given (fused mode), the same call also returns 'document_intent' and
+        on_intent(intent) runs before logging; it returns the thread_id to log under.
+        If fallback is given, a payload that doesn't parse (text the format sniffer took for
+        JSON from its first tokens) is handed to fallback(thread_id) instead of failing.
+        """
+        data = self._load_payload(json_payload)
+        if data is None:
+            if fallback is not None:
+                return fallback(self._fallback_thread(thread_id, on_intent))
+            return self._invalid_payload(thread_id, on_intent)
+
+        system_prompt, user_prompt = self._build_prompts(data, fused=on_intent is not None)
+        schema = self.fused_schema if on_intent is not None else self.response_schema
+        extracted_data = self.llm.generate_structured(system_prompt, user_prompt, schema, profile="json_remap")
+        if on_intent is not None:
+            thread_id = on_intent((extracted_data or {}).pop("document_intent", None))
+        return self._finalize(extracted_data, thread_id)
+
+    async def aprocess_json(self, json_payload: str, thread_id: str, on_intent=None, fallback=None):
+        """
+        Async variant of process_json; awaits the LLM instead of blocking on it. fallback
+        returns an awaitable here.
         """
+        data = self._load_payload(json_payload)
+        if data is None:
+            if fallback is not None:
+                return await fallback(self._fallback_thread(thread_id, on_intent))
+            return self._invalid_payload(thread_id, on_intent)
+
+        system_prompt, user_prompt = await asyncio.to_thread(self._build_prompts, data, fused=on_intent is not None) # fit may count tokens over the network
+        schema = self.fused_schema if on_intent is not None else self.response_schema
+        extracted_data = await self.llm.agenerate_structured(system_prompt, user_prompt, schema, profile="json_remap")
+        if on_intent is not None:
+            thread_id = on_intent((extracted_data or {}).pop("document_intent", None))
+        return self._finalize(extracted_data, thread_id)
+
+    def _load_payload(self, json_payload: str):
         try:
-            data = json.loads(json_payload)
+            return json.loads(json_payload)
+        except json.JSONDecodeError as e:
+            if e.msg == "Extra data":
+                # NDJSON: one JSON value per line, remapped as a list of records
+                records = self._load_ndjson(json_payload)
+                if records is not None:
+                    return records
+            return None
+
+    def _fallback_thread(self, thread_id: str, on_intent=None) -> str:
+        print("JSON Agent: Payload is not valid JSON; handling it as text.")
+        return on_intent(None) if on_intent is not None else thread_id
+
+    def _invalid_payload(self, thread_id: str, on_intent=None):
+        # In fused mode no LLM call is made, but the classification is still logged first and
+        # the error goes under the thread it returns
+        if on_intent is not None:
+            thread_id = on_intent(None)
+        print("JSON Agent: Invalid JSON payload.")
+        self.memory.log_interaction(
+            source="JSONAgent",
+            input_type="JSON",
+            intent="Error",
+            extracted_values={"error": "Invalid JSON format"},
+            thread_id=thread_id
+        )
+        return {"status": "error", "message": "Invalid JSON format"}
+
+    def _load_ndjson(self, json_payload):
+        if isinstance(json_payload, (bytes, bytearray)):
+            json_payload = json_payload.decode("utf-8")
+        try:
+            return [json.loads(line) for line in json_payload.splitlines() if line.strip()]
         except json.JSONDecodeError:
-            print("JSON Agent: Invalid JSON payload.")
-            self.memory.log_interaction(
-                source="JSONAgent",
-                input_type="JSON",
-                intent="Error",
-                extracted_values={"error": "Invalid JSON format"},
-                thread_id=thread_id
-            )
-            return {"status": "error", "message": "Invalid JSON format"}
-
-        # Define a target schema (example for an Invoice)
-        # In a real system, this could be loaded from a configuration or dynamically determined.
-        target_schema = {
-            "invoice_number": None,
-            "customer_name": None,
-            "total_amount": None,
-            "currency": None,
-            "date_issued": None,
-            "line_items": [] # Example for nested data
-        }
+            return None
 
+    def _build_prompts(self, data, fused: bool = False):
         # Use LLM for extraction and reformatting
         system_prompt = f"""You are a JSON processing agent. Your task is to extract information from the provided JSON payload and reformat it according to the target schema.
         If a field is missing or an anomaly is detected (e.g., incorrect data type), note it.
         Return the output as a JSON object matching the target schema, with extracted values.
         Target Schema (example - adjust based on actual intent):
         ```json
-        {json.dumps(target_schema, indent=2)}
+        {json.dumps(self.target_schema, indent=2)}
         ```
         """
-        user_prompt = f"Process the following JSON data:\n\n{json.dumps(data, indent=2)}"
+        if fused:
+            system_prompt += FUSED_INTENT_INSTRUCTION
+        user_prompt = f"Process the following JSON data:\n\n{self.prompts.fit(json.dumps(data, indent=2), 'json_remap')}"
+        return system_prompt, user_prompt
 
-        extracted_json_str = self.llm.generate_response(system_prompt, user_prompt, json_mode=True)
-        
-        if extracted_json_str:
-            try:
-                extracted_data = json.loads(extracted_json_str)
-            except json.JSONDecodeError as e:
-                print(f"JSON Agent: LLM returned invalid JSON: {e}")
-                extracted_data = {"status": "error", "message": "LLM output invalid JSON"}
-        else:
+    def _finalize(self, extracted_data: dict, thread_id: str):
+        if not extracted_data:
             extracted_data = {"status": "error", "message": "LLM extraction failed"}
 
         # Basic anomaly detection and flagging missing fields
         anomalies = []
         missing_fields = []
         
-        for key, value in target_schema.items():
+        for key, value in self.target_schema.items():
             if key not in extracted_data or extracted_data[key] is None:
                 missing_fields.append(key)
             # Add more sophisticated anomaly checks here (e.g., type validation, range checks)
@@ -82,4 +175,4 @@ class JSONAgent:
         )
         
         print(f"JSON Agent: Processed JSON. Anomalies: {anomalies}")
-        return extracted_data
\ No newline at end of file
+        return extracted_data
@@ -0,0 +1,370 @@
+import os
+import re
+import json
+import time
+import random
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterator, List, Protocol
+
+class BackendResponse:
+    """
+    Text of a completion plus the token usage reported by the backend.
+    """
+    def __init__(self, text: str, prompt_tokens: int = 0, output_tokens: int = 0):
+        self.text = text
+        self.prompt_tokens = prompt_tokens
+        self.output_tokens = output_tokens
+
+class LLMBackend(Protocol):
+    """
+    Interface LLMWrapper uses to talk to a model provider. `profile` names the generation
+    profile of the call (see generation_profiles.py); real providers can ignore it.
+    """
+    def generate(self, model: str, prompt: str, generation_config: dict, profile: str = "default") -> BackendResponse: ...
+
+    async def agenerate(self, model: str, prompt: str, generation_config: dict, profile: str = "default") -> BackendResponse: ...
+
+    def generate_stream(self, model: str, prompt: str, generation_config: dict, profile: str = "default") -> Iterator[str]: ...
+
+    async def agenerate_stream(self, model: str, prompt: str, generation_config: dict, profile: str = "default") -> AsyncIterator[str]: ...
+
+    def batch_generate(self, model: str, prompts: List[str], generation_config: dict, profile: str = "default") -> List[BackendResponse]: ...
+    # One entry per prompt, in order: the response, or the exception that prompt failed with
+
+    def count_tokens(self, model: str, text: str) -> int: ...
+
+def estimate_tokens(text: str) -> int:
+    # Rough local estimate (~4 characters per token) used when a backend can't count for us
+    return max(1, len(text) // 4) if text else 0
+
+class GeminiBackend:
+    """
+    Google Gemini via the google-generativeai SDK.
+    """
+    name = "Google Gemini" # Shown in LLMWrapper error messages
+
+    def __init__(self, api_key: str = None, batch_workers: int = 8):
+        # The SDK takes most of a second to import, so it is only loaded once a Gemini backend is built
+        import google.generativeai as genai # Import the Google Gemini library
+        self._genai = genai
+
+        # Configure the Google Generative AI client with your API key
+        genai.configure(api_key=api_key or os.getenv("GOOGLE_API_KEY"))
+        self.batch_workers = batch_workers
+        self._models = {} # model name -> GenerativeModel
+
+    def _client(self, model: str):
+        client = self._models.get(model)
+        if client is None:
+            client = self._genai.GenerativeModel(model)
+            self._models[model] = client
+        return client
+
+    @staticmethod
+    def _to_response(response) -> BackendResponse:
+        usage = getattr(response, "usage_metadata", None)
+        return BackendResponse(
+            response.text,
+            prompt_tokens=getattr(usage, "prompt_token_count", 0) or 0,
+            output_tokens=getattr(usage, "candidates_token_count", 0) or 0,
+        )
+
+    @staticmethod
+    def _chunk_text(chunk) -> str:
+        try:
+            return chunk.text
+        except ValueError:
+            return "" # Chunks without text parts (e.g. the final finish_reason chunk)
+
+    def generate(self, model: str, prompt: str, generation_config: dict, profile: str = "default") -> BackendResponse:
+        response = self._client(model).generate_content(prompt, generation_config=generation_config)
+        return self._to_response(response)
+
+    async def agenerate(self, model: str, prompt: str, generation_config: dict, profile: str = "default") -> BackendResponse:
+        response = await self._client(model).generate_content_async(prompt, generation_config=generation_config)
+        return self._to_response(response)
+
+    def generate_stream(self, model: str, prompt: str, generation_config: dict, profile: str = "default") -> Iterator[str]:
+        # The request is sent here, so quota errors surface before the first chunk is consumed
+        response = self._client(model).generate_content(prompt, generation_config=generation_config, stream=True)
+        return (self._chunk_text(chunk) for chunk in response)
+
+    async def agenerate_stream(self, model: str, prompt: str, generation_config: dict, profile: str = "default") -> AsyncIterator[str]:
+        response = await self._client(model).generate_content_async(prompt, generation_config=generation_config, stream=True)
+
+        async def chunks():
+            async for chunk in response:
+                yield self._chunk_text(chunk)
+        return chunks()
+
+    def batch_generate(self, model: str, prompts: List[str], generation_config: dict, profile: str = "default") -> List[BackendResponse]:
+        # The SDK has no batch endpoint, so fan the prompts out over a small thread pool
+        def generate(prompt):
+            try:
+                return self.generate(model, prompt, generation_config)
+            except Exception as e:
+                return e # One failed prompt doesn't sink the others
+        with ThreadPoolExecutor(max_workers=self.batch_workers) as pool:
+            return list(pool.map(generate, prompts))
+
+    def count_tokens(self, model: str, text: str) -> int:
+        return self._client(model).count_tokens(text).total_tokens
+
+# Fields FakeBackend "extracts" from PDF excerpts
+FAKE_PDF_FIELD_PATTERNS = {
+    "invoice_number": r"invoice (?:number|no\.?)\s*[:#]?\s*([A-Z0-9-]+)",
+    "total_amount": r"^(?:grand )?total(?: due)?\s*:\s*([\d,]+\.\d{2})",
+    "currency": r"\b(USD|EUR|GBP)\b",
+    "date_issued": r"date issued\s*:\s*(\d{4}-\d{2}-\d{2})",
+    "vendor_name": r"^vendor\s*:\s*(.+)$",
+    "customer_name": r"^(?:customer|bill to)\s*:\s*(.+)$",
+}
+
+class FakeBackendError(Exception):
+    """
+    Error raised by FakeBackend; code 429 mimics a Gemini quota error.
+    """
+    def __init__(self, message: str, code: int = 500):
+        super().__init__(message)
+        self.code = code
+
+class FakeBackend:
+    """
+    Offline, deterministic stand-in for Gemini used for load testing and benchmarks.
+
+    latency: mean seconds per call; distribution: "constant", "uniform" or "lognormal"
+    (spread controlled by latency_jitter). output_token_latency: extra seconds per generated
+    token, modelling decode time. error_rate / rate_limit_rate: fraction of calls
+    that fail with a generic error / a 429. responses: list of (regex, text) pairs matched
+    against the prompt in order; unmatched prompts get the canned answer for the call's
+    generation profile (see register_response), shaped to its response_schema.
+    """
+    name = "FakeBackend"
+
+    def __init__(self, latency: float = 0.0, latency_jitter: float = 0.0, distribution: str = "constant",
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, responses=None,
+                 chunk_size: int = 16, seed: int = None, output_token_latency: float = 0.0):
+        self.latency = latency
+        self.output_token_latency = output_token_latency
+        self.latency_jitter = latency_jitter
+        self.distribution = distribution
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.responses = [(re.compile(pattern, re.IGNORECASE | re.DOTALL), text) for pattern, text in (responses or [])]
+        self.chunk_size = chunk_size
+        self._random = random.Random(seed)
+        self.calls = 0
+        # Canned answers per generation profile; other profiles answer "Other"
+        self.canned = {
+            "classify": self._canned_classify,
+            "classify_batch": self._canned_classify_batch,
+            "email_extract": self._canned_email_extract,
+            "json_remap": self._canned_json_remap,
+            "pdf_extract": self._canned_pdf_extract,
+        }
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            latency=float(os.getenv("FAKE_LLM_LATENCY", "0.05")),
+            latency_jitter=float(os.getenv("FAKE_LLM_LATENCY_JITTER", "0.5")),
+            distribution=os.getenv("FAKE_LLM_DISTRIBUTION", "lognormal"),
+            error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+            rate_limit_rate=float(os.getenv("FAKE_LLM_RATE_LIMIT_RATE", "0")),
+            output_token_latency=float(os.getenv("FAKE_LLM_OUTPUT_TOKEN_LATENCY", "0")),
+        )
+
+    def _sample_latency(self) -> float:
+        if self.latency <= 0:
+            return 0.0
+        if self.distribution == "uniform":
+            spread = self.latency * self.latency_jitter
+            return max(0.0, self._random.uniform(self.latency - spread, self.latency + spread))
+        if self.distribution == "lognormal":
+            # Scaled so the median is `latency`; latency_jitter is sigma of the underlying normal
+            return self.latency * self._random.lognormvariate(0.0, self.latency_jitter)
+        return self.latency
+
+    def _maybe_fail(self):
+        roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            raise FakeBackendError("429 Resource has been exhausted (fake)", code=429)
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise FakeBackendError("500 Internal error (fake)")
+
+    def _respond(self, prompt: str, profile: str, schema: dict = None) -> str:
+        for pattern, text in self.responses:
+            if pattern.search(prompt):
+                return text
+        return self.canned.get(profile, self._canned_other)(prompt, schema)
+
+    def register_response(self, profile: str, responder):
+        """
+        Sets the canned answer for calls made with generation profile `profile`;
+        responder(prompt, response_schema) returns the raw model text.
+        """
+        self.canned[profile] = responder
+
+    @staticmethod
+    def _keyword_intent(content: str) -> str:
+        content = content.lower()
+        for keyword, intent in (("invoice", "Invoice"), ("quote", "RFQ"), ("rfq", "RFQ"),
+                                ("complain", "Complaint"), ("dissatisf", "Complaint"), ("regulat", "Regulation")):
+            if keyword in content:
+                return intent
+        return "General Inquiry"
+
+    @staticmethod
+    def _payload(prompt: str, label: str) -> str:
+        # The document follows its label in the user prompt; the instructions before it list every intent
+        return prompt.split(label, 1)[-1]
+
+    def _canned_other(self, prompt: str, schema: dict = None) -> str:
+        return "Other"
+
+    def _canned_classify(self, prompt: str, schema: dict = None) -> str:
+        return self._keyword_intent(self._payload(prompt, "Content:"))
+
+    def _canned_classify_batch(self, prompt: str, schema: dict = None) -> str:
+        # Packed batch: one keyword-based intent per [Document N] slot
+        parts = re.split(r"^\[Document (\d+)\]$", self._payload(prompt, "Documents:"), flags=re.MULTILINE)
+        return json.dumps({"results": [
+            {"slot": int(slot), "intent": self._keyword_intent(content)}
+            for slot, content in zip(parts[1::2], parts[2::2])
+        ]})
+
+    def _canned_pdf_extract(self, prompt: str, schema: dict = None) -> str:
+        return json.dumps(self._pdf_fields(self._payload(prompt, "PDF text:")))
+
+    def _canned_email_extract(self, prompt: str, schema: dict = None) -> str:
+        return self._with_intent({
+            "sender_name": "N/A", "sender_email": "customer@example.com", "subject": "N/A",
+            "extracted_intent": "Inquiry", "urgency": "Medium", "summary": "Canned summary from FakeBackend.",
+        }, prompt, schema)
+
+    def _canned_json_remap(self, prompt: str, schema: dict = None) -> str:
+        return self._with_intent({
+            "invoice_number": "INV-0000", "customer_name": "N/A", "total_amount": 0,
+            "currency": "USD", "date_issued": "N/A", "vendor_name": "N/A", "line_items": [],
+        }, prompt, schema)
+
+    def _with_intent(self, canned: dict, prompt: str, schema: dict = None) -> str:
+        if "document_intent" in (schema or {}).get("properties", {}):
+            # Fused classify+extract request
+            canned["document_intent"] = self._keyword_intent(self._payload(prompt, "Process the following"))
+        return json.dumps(canned)
+
+    @staticmethod
+    def _pdf_fields(text: str) -> dict:
+        """
+        Invoice fields found by regex in the excerpt, like a model that only sees that excerpt.
+        """
+        fields = {}
+        for field, pattern in FAKE_PDF_FIELD_PATTERNS.items():
+            matches = re.findall(pattern, text, re.IGNORECASE | re.MULTILINE)
+            fields[field] = matches[-1].strip() if matches else "N/A" # The last total printed is the final one
+        return fields
+
+    def _conform(self, text: str, schema: dict):
+        """
+        Shapes a canned answer to a response_schema, as Gemini's constrained decoding would.
+        """
+        kind = schema.get("type", "").upper()
+        if kind == "OBJECT":
+            try:
+                canned = json.loads(text)
+            except json.JSONDecodeError:
+                canned = {}
+            if not isinstance(canned, dict):
+                canned = {}
+            return {
+                key: canned[key] if key in canned else self._conform("", prop)
+                for key, prop in schema.get("properties", {}).items()
+            }
+        if kind == "ARRAY":
+            return []
+        if kind in ("NUMBER", "INTEGER"):
+            return 0
+        if kind == "BOOLEAN":
+            return False
+        if "enum" in schema:
+            return text if text in schema["enum"] else schema["enum"][0]
+        return text or "N/A"
+
+    def _complete(self, prompt: str, generation_config: dict, profile: str = "default") -> BackendResponse:
+        self.calls += 1
+        self._maybe_fail()
+        schema = (generation_config or {}).get("response_schema")
+        text = self._respond(prompt, profile, schema)
+        if schema is not None:
+            text = json.dumps(self._conform(text, schema))
+        for stop in (generation_config or {}).get("stop_sequences") or []:
+            text = text.split(stop, 1)[0] # Honour stop sequences like the real API
+        return BackendResponse(text, prompt_tokens=estimate_tokens(prompt), output_tokens=estimate_tokens(text))
+
+    def _chunks(self, text: str) -> List[str]:
+        return [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+
+    def _decode_time(self, response: BackendResponse) -> float:
+        return response.output_tokens * self.output_token_latency
+
+    def generate(self, model: str, prompt: str, generation_config: dict, profile: str = "default") -> BackendResponse:
+        time.sleep(self._sample_latency())
+        response = self._complete(prompt, generation_config, profile)
+        time.sleep(self._decode_time(response))
+        return response
+
+    async def agenerate(self, model: str, prompt: str, generation_config: dict, profile: str = "default") -> BackendResponse:
+        await asyncio.sleep(self._sample_latency())
+        response = self._complete(prompt, generation_config, profile)
+        await asyncio.sleep(self._decode_time(response))
+        return response
+
+    def generate_stream(self, model: str, prompt: str, generation_config: dict, profile: str = "default") -> Iterator[str]:
+        response = self._complete(prompt, generation_config, profile) # Fail before the first chunk, like the real API
+        chunks = self._chunks(response.text)
+        delay = (self._sample_latency() + self._decode_time(response)) / max(1, len(chunks))
+
+        def stream():
+            for chunk in chunks:
+                time.sleep(delay)
+                yield chunk
+        return stream()
+
+    async def agenerate_stream(self, model: str, prompt: str, generation_config: dict, profile: str = "default") -> AsyncIterator[str]:
+        response = self._complete(prompt, generation_config, profile)
+        chunks = self._chunks(response.text)
+        delay = (self._sample_latency() + self._decode_time(response)) / max(1, len(chunks))
+
+        async def stream():
+            for chunk in chunks:
+                await asyncio.sleep(delay)
+                yield chunk
+        return stream()
+
+    def batch_generate(self, model: str, prompts: List[str], generation_config: dict, profile: str = "default") -> List[BackendResponse]:
+        # One simulated round trip for the whole batch; failures are per prompt
+        time.sleep(self._sample_latency())
+        responses = []
+        for prompt in prompts:
+            try:
+                responses.append(self._complete(prompt, generation_config, profile))
+            except FakeBackendError as e:
+                responses.append(e)
+        time.sleep(max((self._decode_time(response) for response in responses if isinstance(response, BackendResponse)), default=0.0))
+        return responses
+
+    def count_tokens(self, model: str, text: str) -> int:
+        return estimate_tokens(text)
+
+def create_backend(name: str = None) -> LLMBackend:
+    """
+    Builds the backend named by `name` or the LLM_BACKEND env var ("gemini" or "fake").
+    """
+    name = (name or os.getenv("LLM_BACKEND", "gemini")).lower()
+    if name == "fake":
+        return FakeBackend.from_env()
+    if name == "gemini":
+        return GeminiBackend()
+    raise ValueError(f"Unknown LLM backend: {name}")
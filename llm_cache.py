@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+class ResponseCache:
+    """
+    Content-addressed cache for LLM responses.
+    An in-memory LRU tier sits in front of an optional SQLite tier that survives restarts.
+    """
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = None, db_path: str = None, max_disk_entries: int = 100000):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds or None # None/0 means entries never expire
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict() # key -> (stored_at, value), most recently used last
+        self.eviction_batch = max(1, max_disk_entries // 100) # Rows dropped below the cap per eviction
+        self._lock = threading.Lock()
+        self._db = None
+        self._disk_entries = 0
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS llm_cache_stored_at ON llm_cache (stored_at)")
+            self._db.commit()
+            self._disk_entries = self._db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    @classmethod
+    def from_env(cls):
+        """
+        Builds a cache from LLM_CACHE_* environment variables.
+        """
+        return cls(
+            max_entries=int(os.getenv("LLM_CACHE_SIZE", "1024")),
+            ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", "0")),
+            db_path=os.getenv("LLM_CACHE_PATH") or None,
+            max_disk_entries=int(os.getenv("LLM_CACHE_DISK_SIZE", "100000")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 or self._db is not None
+
+    @staticmethod
+    def make_key(model: str, full_prompt: str, generation_config: dict, json_mode: bool) -> str:
+        """
+        Hashes everything that influences the model output into a stable cache key.
+        """
+        payload = json.dumps(
+            {"model": model, "prompt": full_prompt, "config": generation_config, "json_mode": json_mode},
+            sort_keys=True,
+            default=str # Schemas or other SDK objects in the config are keyed by their repr
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - stored_at > self.ttl_seconds
+
+    def get(self, key: str):
+        """
+        Returns the cached value for key, or None on a miss.
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if not self._expired(stored_at):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute("SELECT value, stored_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    value, stored_at = row
+                    if not self._expired(stored_at):
+                        self._remember(key, stored_at, value) # Promote to the memory tier
+                        self.hits += 1
+                        return value
+                    self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._db.commit()
+                    self._disk_entries -= 1
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            stored_at = time.time()
+            self._remember(key, stored_at, value)
+            if self._db is not None:
+                exists = self._db.execute("SELECT 1 FROM llm_cache WHERE key = ?", (key,)).fetchone() is not None
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, stored_at) VALUES (?, ?, ?)",
+                    (key, value, stored_at)
+                )
+                if not exists:
+                    self._disk_entries += 1
+                if self._disk_entries > self.max_disk_entries:
+                    # Over the cap: drop the oldest rows (indexed) with some headroom, so this runs once per batch
+                    excess = self._disk_entries - max(0, self.max_disk_entries - self.eviction_batch)
+                    self._db.execute(
+                        "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY stored_at LIMIT ?)", (excess,)
+                    )
+                    self._disk_entries -= excess
+                self._db.commit()
+
+    def _remember(self, key: str, stored_at: float, value: str):
+        # Caller holds the lock
+        if self.max_entries <= 0:
+            return
+        self._memory[key] = (stored_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False) # Drop the least recently used entry
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
+                self._disk_entries = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+            }
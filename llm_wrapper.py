@@ -1,75 +1,476 @@
 import os
+import time
+import asyncio
+import weakref
+import threading
 from dotenv import load_dotenv
-import google.generativeai as genai # Import the Google Gemini library
 import json # Import json for parsing/dumping if needed
+from llm_cache import ResponseCache
+from single_flight import SingleFlight
+from rate_limiter import RateLimiter
+from incremental_json import IncrementalJSONParser
+from llm_backends import LLMBackend, create_backend, estimate_tokens
+from generation_profiles import get_profile, ProfileStats
 
 load_dotenv() # Load environment variables from .env file
 
 class LLMWrapper:
-    def __init__(self, model="gemini-1.5-flash"): # Default to a robust and often free-tier friendly model
+    def __init__(self, model="gemini-1.5-flash", max_concurrency: int = None, timeout: float = None, cache: ResponseCache = None, backend: LLMBackend = None): # Default to a robust and often free-tier friendly model
         self.model = os.getenv("GEMINI_MODEL", model) # Allow model to be overridden by env var
-        
-        # Configure the Google Generative AI client with your API key
-        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-        
-        # Initialize the GenerativeModel instance
-        self.client = genai.GenerativeModel(self.model)
-
-    def generate_response(self, system_prompt: str, user_prompt: str, json_mode: bool = False):
+
+        # Model provider; LLM_BACKEND=fake swaps Gemini for the offline FakeBackend.
+        # Built on first use so importing an agent doesn't pay for the SDK import and client setup.
+        self._backend = backend
+        self._backend_lock = threading.Lock()
+
+        # Async path: cap on concurrent in-flight calls and a per-call deadline (seconds)
+        self.max_concurrency = max_concurrency or int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+        self.timeout = timeout or float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+        self._semaphores = weakref.WeakKeyDictionary() # One semaphore per running event loop
+
+        # Temperature is pinned to 0.0, so identical requests can safely reuse earlier responses
+        self.cache = cache if cache is not None else ResponseCache.from_env()
+
+        # Concurrent callers with the same request key wait on one outstanding call
+        self.inflight = SingleFlight()
+
+        # Client-side RPM/TPM quotas; 429s are retried with jittered backoff instead of dropping the document
+        self.rate_limiter = RateLimiter.from_env()
+
+        # Latency and token spend attributed per generation profile (see generation_profiles.py)
+        self.profile_stats = ProfileStats()
+
+    @property
+    def backend(self) -> LLMBackend:
+        if self._backend is None:
+            with self._backend_lock:
+                if self._backend is None:
+                    self._backend = create_backend()
+        return self._backend
+
+    @backend.setter
+    def backend(self, backend: LLMBackend):
+        self._backend = backend
+
+    def _build_request(self, system_prompt: str, user_prompt: str, json_mode: bool, schema: dict = None, profile: str = "default"):
+        """
+        Builds the model name, full prompt and generation config shared by the sync and async paths.
+        """
+        settings = get_profile(profile)
+        model = settings.get("model") or self.model
+
         # Gemini's API typically handles system prompts by prepending them to the user prompt,
         # or by using specific roles in a chat history. For a single turn, prepending is common.
         full_prompt = f"{system_prompt}\n\n{user_prompt}"
-        
+
         generation_config = {
             "temperature": 0.0, # Keep temperature low for deterministic tasks like classification/extraction
-            "max_output_tokens": 2000, # Set a reasonable maximum output length
+            "max_output_tokens": settings["max_output_tokens"], # Right-sized per task by the profile
         }
-        
-        # Gemini does not have a direct 'response_format={"type": "json_object"}' parameter
+        if settings.get("stop_sequences"):
+            generation_config["stop_sequences"] = list(settings["stop_sequences"])
+
+        if schema is not None:
+            # Native structured output: Gemini constrains decoding to the schema, so the output
+            # is plain JSON with no instruction suffix or markdown fences to strip
+            generation_config["response_mime_type"] = "application/json"
+            generation_config["response_schema"] = schema
+        # Without a schema, Gemini has no direct 'response_format={"type": "json_object"}' parameter
         # like OpenAI. We instruct it in the prompt and then parse the output.
-        if json_mode:
+        elif json_mode:
             full_prompt += "\nYour response MUST be a valid JSON object."
             # Optionally, you can add a hint to start the JSON block
             # full_prompt += "\n```json\n" # This can sometimes help the model output valid markdown JSON
 
+        return model, full_prompt, generation_config
+
+    def _parse_content(self, content: str, json_mode: bool):
+        """
+        Post-processes the raw model text, normalising JSON output when requested.
+        Returns (content, valid); invalid JSON is passed through but must not be cached.
+        """
+        # If JSON mode was requested, attempt to parse the content
+        if json_mode:
+            try:
+                # Models often wrap JSON in markdown blocks, so try to strip them
+                if content.strip().startswith("```json"):
+                    content = content.strip()[len("```json"):].strip()
+                    if content.endswith("```"):
+                        content = content[:-len("```")].strip()
+                elif content.strip().startswith("```"): # Generic markdown block
+                    content = content.strip()[len("```"):].strip()
+                    if content.endswith("```"):
+                        content = content[:-len("```")].strip()
+
+                # Attempt to load the JSON content
+                return json.dumps(json.loads(content)), True # Ensure it's valid JSON, return as string
+            except json.JSONDecodeError as e:
+                print(f"Warning: LLM did not return valid JSON despite instruction. Error: {e}. Content: {content[:500]}...")
+                # Fallback: if JSON parsing fails, return raw content; calling agent might handle or log error
+                return content, False
+
+        return content, True
+
+    def _cache_get(self, request_key: str, profile: str):
+        if not self.cache.enabled:
+            return None
+        cached = self.cache.get(request_key)
+        if cached is not None:
+            self.profile_stats.record_cache_hit(profile)
+        return cached
+
+    def _cache_store(self, request_key: str, content: str, valid: bool):
+        if self.cache.enabled and valid and content is not None:
+            self.cache.set(request_key, content)
+
+    def _estimate_tokens(self, full_prompt: str, generation_config: dict) -> int:
+        # Rough pre-call estimate (~4 characters per token) plus the worst-case output for the TPM bucket
+        return len(full_prompt) // 4 + generation_config.get("max_output_tokens", 0)
+
+    def count_tokens(self, text: str) -> int:
+        """
+        Counts tokens with the backend, falling back to the local estimate if it can't.
+        """
         try:
-            # Call the Gemini API to generate content
-            response = self.client.generate_content(
-                full_prompt,
-                generation_config=generation_config
-            )
-            
+            return self.backend.count_tokens(self.model, text)
+        except Exception:
+            return estimate_tokens(text)
+
+    def _report_error(self, e: Exception, profile: str):
+        self.profile_stats.record_error(profile)
+        backend = getattr(self.backend, "name", type(self.backend).__name__)
+        if isinstance(e, asyncio.TimeoutError):
+            print(f"Error generating LLM response with {backend}: timed out after {self.timeout}s")
+            return
+        # Catch specific Gemini API errors, like safety settings blocks
+        if hasattr(e, 'response') and hasattr(e.response, 'prompt_feedback'):
+            print(f"LLM Response blocked by safety settings: {e.response.prompt_feedback}")
+        print(f"Error generating LLM response with {backend}: {e}")
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # asyncio primitives are bound to the loop they are first used on, so keep one per loop
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    def _call_with_retries(self, estimated_tokens: int, fn):
+        """
+        Runs fn() under the rate limiter, retrying with backoff when Gemini reports a quota error.
+        """
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire(estimated_tokens)
+            try:
+                return fn()
+            except Exception as e:
+                if not self.rate_limiter.is_rate_limit_error(e) or attempt >= self.rate_limiter.max_retries:
+                    raise
+                delay = self.rate_limiter.backoff(attempt)
+                print(f"LLM rate limited, retrying in {delay:.1f}s (attempt {attempt + 1}/{self.rate_limiter.max_retries})")
+                time.sleep(delay)
+                attempt += 1
+
+    async def _acall_with_retries(self, estimated_tokens: int, coro_fn):
+        """
+        Async counterpart of _call_with_retries; coro_fn is a zero-argument callable returning an awaitable.
+        """
+        attempt = 0
+        while True:
+            await self.rate_limiter.aacquire(estimated_tokens)
+            try:
+                return await coro_fn()
+            except Exception as e:
+                if not self.rate_limiter.is_rate_limit_error(e) or attempt >= self.rate_limiter.max_retries:
+                    raise
+                delay = self.rate_limiter.backoff(attempt)
+                print(f"LLM rate limited, retrying in {delay:.1f}s (attempt {attempt + 1}/{self.rate_limiter.max_retries})")
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def _record(self, profile: str, started: float, response):
+        self.profile_stats.record_call(profile, time.perf_counter() - started, response.prompt_tokens, response.output_tokens)
+        return response
+
+    def _send(self, model: str, full_prompt: str, generation_config: dict, profile: str):
+        # Call the Gemini API to generate content
+        started = time.perf_counter()
+        response = self._call_with_retries(
+            self._estimate_tokens(full_prompt, generation_config),
+            lambda: self.backend.generate(model, full_prompt, generation_config, profile=profile)
+        )
+        return self._record(profile, started, response)
+
+    async def _asend(self, model: str, full_prompt: str, generation_config: dict, profile: str, timeout: float = None):
+        async def send():
+            # Backoff happens outside the semaphore so other calls can proceed meanwhile
+            async with self._get_semaphore():
+                return await asyncio.wait_for(
+                    self.backend.agenerate(model, full_prompt, generation_config, profile=profile),
+                    timeout=timeout or self.timeout
+                )
+        started = time.perf_counter()
+        response = await self._acall_with_retries(self._estimate_tokens(full_prompt, generation_config), send)
+        return self._record(profile, started, response)
+
+    def generate_response(self, system_prompt: str, user_prompt: str, json_mode: bool = False, profile: str = "default"):
+        model, full_prompt, generation_config = self._build_request(system_prompt, user_prompt, json_mode, profile=profile)
+        request_key = ResponseCache.make_key(model, full_prompt, generation_config, json_mode)
+        cached = self._cache_get(request_key, profile)
+        if cached is not None:
+            return cached
+
+        def call_model():
+            response = self._send(model, full_prompt, generation_config, profile)
+
             # Access the generated text from the response object
-            content = response.text
-            
-            # If JSON mode was requested, attempt to parse the content
-            if json_mode:
-                try:
-                    # Models often wrap JSON in markdown blocks, so try to strip them
-                    if content.strip().startswith("```json"):
-                        content = content.strip()[len("```json"):].strip()
-                        if content.endswith("```"):
-                            content = content[:-len("```")].strip()
-                    elif content.strip().startswith("```"): # Generic markdown block
-                        content = content.strip()[len("```"):].strip()
-                        if content.endswith("```"):
-                            content = content[:-len("```")].strip()
-                            
-                    # Attempt to load the JSON content
-                    return json.dumps(json.loads(content)) # Ensure it's valid JSON, return as string
-                except json.JSONDecodeError as e:
-                    print(f"Warning: LLM did not return valid JSON despite instruction. Error: {e}. Content: {content[:500]}...")
-                    # Fallback: if JSON parsing fails, return raw content; calling agent might handle or log error
-                    return content 
-            
+            content, valid = self._parse_content(response.text, json_mode)
+            self._cache_store(request_key, content, valid)
             return content
 
+        try:
+            # Identical requests already in flight share one Gemini call
+            return self.inflight.do(request_key, call_model)
+
         except Exception as e:
-            # Catch specific Gemini API errors, like safety settings blocks
-            if hasattr(e, 'response') and hasattr(e.response, 'prompt_feedback'):
-                print(f"LLM Response blocked by safety settings: {e.response.prompt_feedback}")
-            print(f"Error generating LLM response with Google Gemini: {e}")
+            self._report_error(e, profile)
             return None
 
+    async def agenerate_response(self, system_prompt: str, user_prompt: str, json_mode: bool = False, profile: str = "default", timeout: float = None):
+        """
+        Async counterpart of generate_response. At most max_concurrency calls are in flight
+        per event loop, and each call is abandoned after `timeout` seconds (default self.timeout).
+        """
+        model, full_prompt, generation_config = self._build_request(system_prompt, user_prompt, json_mode, profile=profile)
+        request_key = ResponseCache.make_key(model, full_prompt, generation_config, json_mode)
+        cached = self._cache_get(request_key, profile)
+        if cached is not None:
+            return cached
+
+        async def call_model():
+            response = await self._asend(model, full_prompt, generation_config, profile, timeout)
+            content, valid = self._parse_content(response.text, json_mode)
+            self._cache_store(request_key, content, valid)
+            return content
+
+        try:
+            return await self.inflight.ado(request_key, call_model)
+
+        except Exception as e:
+            self._report_error(e, profile)
+            return None
+
+    def _load_structured(self, request_key: str, text: str):
+        """
+        Parses a structured-output response once; only dict results are cached and returned.
+        """
+        try:
+            data = json.loads(text)
+        except (json.JSONDecodeError, TypeError) as e:
+            print(f"Warning: LLM returned invalid structured output. Error: {e}. Content: {str(text)[:500]}...")
+            return None
+        if not isinstance(data, dict):
+            print(f"Warning: LLM structured output is not a JSON object: {str(text)[:500]}...")
+            return None
+        self._cache_store(request_key, text, True)
+        return data
+
+    def generate_structured(self, system_prompt: str, user_prompt: str, schema: dict, profile: str = "default", raise_errors: bool = False):
+        """
+        Asks Gemini for JSON constrained to `schema` (response_mime_type="application/json" plus
+        response_schema) and returns it as a dict, or None on failure. With raise_errors, backend
+        errors are re-raised after being reported, so only unparseable output returns None.
+        """
+        model, full_prompt, generation_config = self._build_request(system_prompt, user_prompt, json_mode=True, schema=schema, profile=profile)
+        request_key = ResponseCache.make_key(model, full_prompt, generation_config, True)
+        cached = self._cache_get(request_key, profile)
+        if cached is not None:
+            return json.loads(cached)
+
+        try:
+            # Coalesced callers share the raw text and each parse their own copy, since agents mutate the result
+            text = self.inflight.do(request_key, lambda: self._send(model, full_prompt, generation_config, profile).text)
+        except Exception as e:
+            self._report_error(e, profile)
+            if raise_errors:
+                raise
+            return None
+        return self._load_structured(request_key, text)
+
+    async def agenerate_structured(self, system_prompt: str, user_prompt: str, schema: dict, profile: str = "default", timeout: float = None, raise_errors: bool = False):
+        """
+        Async counterpart of generate_structured.
+        """
+        model, full_prompt, generation_config = self._build_request(system_prompt, user_prompt, json_mode=True, schema=schema, profile=profile)
+        request_key = ResponseCache.make_key(model, full_prompt, generation_config, True)
+        cached = self._cache_get(request_key, profile)
+        if cached is not None:
+            return json.loads(cached)
+
+        async def call_model():
+            response = await self._asend(model, full_prompt, generation_config, profile, timeout)
+            return response.text
+
+        try:
+            text = await self.inflight.ado(request_key, call_model)
+        except Exception as e:
+            self._report_error(e, profile)
+            if raise_errors:
+                raise
+            return None
+        return self._load_structured(request_key, text)
+
+    def generate_batch(self, system_prompt: str, user_prompts: list, json_mode: bool = False, profile: str = "default"):
+        """
+        Generates one response per user prompt in a single backend batch call.
+        Cached prompts are served from the cache; failed items come back as None. Each prompt
+        takes its own rate limiter slot, and only rate-limited items are retried.
+        """
+        requests = [self._build_request(system_prompt, user_prompt, json_mode, profile=profile) for user_prompt in user_prompts]
+        request_keys = [ResponseCache.make_key(model, full_prompt, generation_config, json_mode)
+                        for model, full_prompt, generation_config in requests]
+        results = [self._cache_get(request_key, profile) for request_key in request_keys]
+        pending = [i for i, result in enumerate(results) if result is None]
+        if not pending:
+            return results
+
+        model, _, generation_config = requests[0]
+        attempt = 0
+        while pending:
+            for i in pending:
+                self.rate_limiter.acquire(self._estimate_tokens(requests[i][1], generation_config))
+            started = time.perf_counter()
+            try:
+                responses = self.backend.batch_generate(model, [requests[i][1] for i in pending], generation_config, profile=profile)
+            except Exception as e:
+                responses = [e] * len(pending) # The whole round trip failed
+            latency = time.perf_counter() - started
+
+            retry = []
+            for i, response in zip(pending, responses):
+                if isinstance(response, Exception):
+                    if self.rate_limiter.is_rate_limit_error(response) and attempt < self.rate_limiter.max_retries:
+                        retry.append(i)
+                    else:
+                        self._report_error(response, profile)
+                    continue
+                # The batch shares one round trip; spread its latency over the items
+                self.profile_stats.record_call(profile, latency / len(pending), response.prompt_tokens, response.output_tokens)
+                content, valid = self._parse_content(response.text, json_mode)
+                self._cache_store(request_keys[i], content, valid)
+                results[i] = content
+
+            if retry:
+                delay = self.rate_limiter.backoff(attempt)
+                print(f"LLM rate limited, retrying {len(retry)} of {len(pending)} batch items in {delay:.1f}s (attempt {attempt + 1}/{self.rate_limiter.max_retries})")
+                time.sleep(delay)
+                attempt += 1
+            pending = retry
+        return results
+
+    def _build_stream_request(self, system_prompt: str, user_prompt: str, required_keys, schema: dict, profile: str):
+        model, full_prompt, generation_config = self._build_request(system_prompt, user_prompt, json_mode=True, schema=schema, profile=profile)
+        # A cut-off stream only guarantees the required keys, so they are part of the cache key
+        key_config = dict(generation_config, stream_required_keys=sorted(required_keys))
+        request_key = ResponseCache.make_key(model, full_prompt, key_config, True)
+        return model, full_prompt, generation_config, request_key
+
+    def _record_stream(self, profile: str, started: float, full_prompt: str, parser: IncrementalJSONParser):
+        # Streams don't report usage until the end (and are often cut off), so estimate locally
+        self.profile_stats.record_call(profile, time.perf_counter() - started, estimate_tokens(full_prompt), estimate_tokens(parser.buffer))
+
+    def _replay_cached_fields(self, cached: str, on_field):
+        fields = json.loads(cached)
+        if on_field is not None:
+            for key, value in fields.items():
+                on_field(key, value)
+        return fields
+
+    def _consume_chunk(self, parser: IncrementalJSONParser, text: str, required_keys, on_field) -> bool:
+        """
+        Feeds one streamed chunk to the parser; returns True once the stream can be cut off.
+        """
+        for key, value in parser.feed(text):
+            if on_field is not None:
+                on_field(key, value)
+        return parser.complete or (bool(required_keys) and parser.has_keys(required_keys))
+
+    def _finish_stream(self, parser: IncrementalJSONParser, request_key: str, required_keys):
+        if parser.complete or (required_keys and parser.has_keys(required_keys)):
+            self._cache_store(request_key, json.dumps(parser.fields), True)
+            return parser.fields
+        if parser.fields:
+            return parser.fields # Truncated stream: usable, but not cached
+        # Nothing parsed incrementally; fall back to the regular JSON clean-up
+        content, valid = self._parse_content(parser.buffer, json_mode=True)
+        if not valid:
+            return None
+        return self._load_structured(request_key, content)
+
+    def generate_response_stream(self, system_prompt: str, user_prompt: str, required_keys=None, on_field=None, schema: dict = None, profile: str = "default"):
+        """
+        Streams a JSON response, calling on_field(key, value) as soon as each top-level field
+        is complete. Once every key in required_keys has arrived the stream is abandoned, which
+        saves the remaining output tokens. With a schema, output is constrained as in
+        generate_structured. Returns the fields as a dict, or None on failure.
+        """
+        required_keys = list(required_keys or [])
+        model, full_prompt, generation_config, request_key = self._build_stream_request(system_prompt, user_prompt, required_keys, schema, profile)
+        cached = self._cache_get(request_key, profile)
+        if cached is not None:
+            return self._replay_cached_fields(cached, on_field)
+
+        parser = IncrementalJSONParser()
+        started = time.perf_counter()
+        try:
+            response = self._call_with_retries(
+                self._estimate_tokens(full_prompt, generation_config),
+                lambda: self.backend.generate_stream(model, full_prompt, generation_config, profile=profile)
+            )
+            for chunk in response:
+                if self._consume_chunk(parser, chunk, required_keys, on_field):
+                    break
+        except Exception as e:
+            self._report_error(e, profile)
+            return None
+        self._record_stream(profile, started, full_prompt, parser)
+
+        return self._finish_stream(parser, request_key, required_keys)
+
+    async def agenerate_response_stream(self, system_prompt: str, user_prompt: str, required_keys=None, on_field=None, schema: dict = None, profile: str = "default", timeout: float = None):
+        """
+        Async counterpart of generate_response_stream. The stream holds a concurrency slot
+        until it completes or is cut off, and is abandoned after `timeout` seconds.
+        """
+        required_keys = list(required_keys or [])
+        model, full_prompt, generation_config, request_key = self._build_stream_request(system_prompt, user_prompt, required_keys, schema, profile)
+        cached = self._cache_get(request_key, profile)
+        if cached is not None:
+            return self._replay_cached_fields(cached, on_field)
+
+        parser = IncrementalJSONParser()
+        started = time.perf_counter()
+
+        async def consume():
+            async with self._get_semaphore():
+                response = await self._acall_with_retries(
+                    self._estimate_tokens(full_prompt, generation_config),
+                    lambda: self.backend.agenerate_stream(model, full_prompt, generation_config, profile=profile)
+                )
+                async for chunk in response:
+                    if self._consume_chunk(parser, chunk, required_keys, on_field):
+                        break
+
+        try:
+            await asyncio.wait_for(consume(), timeout=timeout or self.timeout)
+        except Exception as e:
+            self._report_error(e, profile)
+            return None
+        self._record_stream(profile, started, full_prompt, parser)
+
+        return self._finish_stream(parser, request_key, required_keys)
+
 # Re-instantiate the global LLM wrapper with the new client
-llm_wrapper = LLMWrapper()
\ No newline at end of file
+llm_wrapper = LLMWrapper()
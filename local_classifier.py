@@ -0,0 +1,153 @@
+import os
+import re
+import math
+import zlib
+import threading
+
+INTENTS = ["Invoice", "RFQ", "Complaint", "Regulation", "General Inquiry", "Other"]
+
+# Small hand-written training set so the model is useful before any harvested examples exist
+SEED_EXAMPLES = [
+    ("Invoice INV-2024-001 attached. Amount due: $1,250.00, payment due within 30 days.", "Invoice"),
+    ("Please find attached our invoice for services rendered in March. Total due 540.00 EUR.", "Invoice"),
+    ("Invoice number 4471, bill to Acme Corp, subtotal, tax and total amount due by the due date.", "Invoice"),
+    ("This is a reminder that invoice #889 remains unpaid. Please remit payment to the account below.", "Invoice"),
+    ("document_type invoice invoice_data invoice_number amount_due customer vendor line_items", "Invoice"),
+    ("Billing statement: balance due, remit to, payment terms net 30, invoice date.", "Invoice"),
+    ("Please quote 100 units of your Model X widgets with delivery to Berlin.", "RFQ"),
+    ("Request for quotation: we would like pricing for 500 steel brackets and your lead time.", "RFQ"),
+    ("Could you send us a quote for the enterprise license for 50 seats?", "RFQ"),
+    ("RFQ #2231 for industrial pumps. Kindly provide unit price, quantity discounts and delivery terms.", "RFQ"),
+    ("We are requesting a proposal and price quote for annual maintenance services.", "RFQ"),
+    ("What would be the cost to order 2,000 units? Please include shipping in your quotation.", "RFQ"),
+    ("I am very dissatisfied with the service. The order arrived damaged and nobody answered my calls.", "Complaint"),
+    ("This is a formal complaint about the late delivery and the rude support staff.", "Complaint"),
+    ("The product stopped working after two days. I want a refund, this is unacceptable.", "Complaint"),
+    ("I am disappointed and frustrated: I was charged twice and the issue is still not resolved.", "Complaint"),
+    ("Your technician never showed up. Terrible experience, I expect compensation.", "Complaint"),
+    ("Notice of regulatory change: new compliance requirements under GDPR take effect next quarter.", "Regulation"),
+    ("The directive requires all suppliers to comply with the updated safety regulation and reporting rules.", "Regulation"),
+    ("Pursuant to section 4 of the act, companies must submit an annual compliance filing to the authority.", "Regulation"),
+    ("Regulatory update: the agency has amended the rule on data retention and audit obligations.", "Regulation"),
+    ("Compliance notice regarding the new legislation on emissions standards and penalties for violations.", "Regulation"),
+    ("Can you tell me about your pricing for enterprise solutions?", "General Inquiry"),
+    ("What are your office hours and how can I reach customer support?", "General Inquiry"),
+    ("I would like more information about your products and services.", "General Inquiry"),
+    ("Do you offer training for new users? Where can I find the documentation?", "General Inquiry"),
+    ("Hello, I have a question about how your platform works.", "General Inquiry"),
+    ("Could you please tell me whether you ship internationally?", "General Inquiry"),
+    ("Happy holidays from all of us! See you at the team lunch on Friday.", "Other"),
+    ("Meeting notes attached. Lunch menu for next week: pasta, salad and soup.", "Other"),
+    ("Out of office: I am on vacation until Monday with limited access to email.", "Other"),
+    ("Thanks for the birthday wishes, everyone!", "Other"),
+    ("Unsubscribe me from this newsletter.", "Other"),
+    ("Weekly newsletter: company picnic photos and parking lot maintenance schedule.", "Other"),
+]
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+class LocalIntentClassifier:
+    """
+    In-process multinomial naive Bayes over hashed word unigrams and bigrams.
+    predict returns (intent, confidence); callers escalate to the LLM when
+    confidence is below `threshold`. The posteriors aren't calibrated, so the default
+    threshold is above 1: the model only guesses (logged next to the LLM's label, see
+    IntentTrainer.metrics) until a threshold is chosen from measured agreement.
+    """
+    def __init__(self, n_features: int = 2 ** 18, alpha: float = 0.1, threshold: float = 1.01, max_chars: int = 5000):
+        self.n_features = n_features
+        self.alpha = alpha # Laplace smoothing
+        self.threshold = threshold # Above 1 never decides locally
+        self.max_chars = max_chars # Only the head of long documents is featurized
+        self._lock = threading.Lock()
+        self._model = None # Trained lazily on SEED_EXAMPLES at first use
+        self.version = 0 # Bumped by every install
+
+    @classmethod
+    def from_env(cls):
+        # A threshold above 1 disables local decisions (every document goes to the LLM)
+        return cls(threshold=float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD", "1.01")))
+
+    def features(self, text: str) -> dict:
+        """
+        Hashed unigram and bigram counts. crc32 keeps bucket ids stable across processes.
+        """
+        words = WORD_PATTERN.findall(text[:self.max_chars].lower())
+        counts = {}
+        for gram in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            bucket = zlib.crc32(gram.encode("utf-8")) % self.n_features
+            counts[bucket] = counts.get(bucket, 0) + 1
+        return counts
+
+    def train(self, examples) -> dict:
+        """
+        Builds a model from (text, intent) pairs and returns it without installing it.
+        """
+        class_docs = {intent: 0 for intent in INTENTS}
+        feature_counts = {intent: {} for intent in INTENTS}
+        for text, intent in examples:
+            if intent not in class_docs:
+                continue
+            class_docs[intent] += 1
+            counts = feature_counts[intent]
+            for bucket, count in self.features(text).items():
+                counts[bucket] = counts.get(bucket, 0) + count
+        total_docs = sum(class_docs.values())
+        vocabulary = set()
+        for counts in feature_counts.values():
+            vocabulary.update(counts)
+        model = {"intents": [], "log_prior": {}, "counts": feature_counts, "totals": {}, "vocabulary": vocabulary, "examples": total_docs}
+        for intent, docs in class_docs.items():
+            if docs == 0:
+                continue
+            model["intents"].append(intent)
+            model["log_prior"][intent] = math.log(docs / total_docs)
+            model["totals"][intent] = sum(feature_counts[intent].values()) + self.alpha * max(1, len(vocabulary))
+        return model
+
+    def install(self, model: dict):
+        """
+        Atomically replaces the model used by predict (hot swap).
+        """
+        with self._lock:
+            self._model = model
+            self.version += 1
+
+    def _current_model(self) -> dict:
+        model = self._model
+        if model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self.train(SEED_EXAMPLES)
+                model = self._model
+        return model
+
+    def predict(self, text: str):
+        """
+        Returns (intent, confidence) where confidence is the posterior of the best intent.
+        Documents with no known features get (None, 0.0).
+        """
+        model = self._current_model()
+        known = {bucket: count for bucket, count in self.features(text).items() if bucket in model["vocabulary"]}
+        if not known or not model["intents"]:
+            return None, 0.0
+        # Naive Bayes is overconfident on long documents; temper the likelihood by sqrt(feature count)
+        temper = 1.0 / math.sqrt(sum(known.values()))
+        scores = {}
+        for intent in model["intents"]:
+            counts = model["counts"][intent]
+            total = model["totals"][intent]
+            likelihood = sum(count * math.log((counts.get(bucket, 0) + self.alpha) / total) for bucket, count in known.items())
+            scores[intent] = model["log_prior"][intent] + likelihood * temper
+        best = max(scores, key=scores.get)
+        normalizer = sum(math.exp(score - scores[best]) for score in scores.values())
+        return best, 1.0 / normalizer
+
+    def is_confident(self, intent: str, confidence: float) -> bool:
+        """
+        True if a prediction is good enough to skip the LLM.
+        """
+        return intent is not None and confidence >= self.threshold
+
+# Global instance, shared by ClassifierAgent instances like llm_wrapper
+local_classifier = LocalIntentClassifier.from_env()
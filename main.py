@@ -1,67 +1,179 @@
 from classifier_agent import ClassifierAgent
 from json_agent import JSONAgent
 from email_agent import EmailAgent
+from pdf_agent import PDFAgent
 from memory_module import shared_memory, SharedMemory # Import SharedMemory class for reset
+from intent_trainer import IntentTrainer
+from document_handle import DocumentHandle
 import json # Make sure json is imported for printing results
+import asyncio
+import os
 
 class MultiAgentSystem:
-    def __init__(self):
-        self.classifier_agent = ClassifierAgent()
-        self.json_agent = JSONAgent()
-        self.email_agent = EmailAgent()
-        self.memory = shared_memory
+    def __init__(self, llm=None, memory=None, fused: bool = None):
+        # llm/memory default to the global instances; inject an LLMWrapper(backend=FakeBackend(...)) for offline runs
+        self.memory = memory or shared_memory
+        # Fused mode: one structured call returns both the intent and the extraction for Email/JSON inputs
+        self.fused = fused if fused is not None else os.getenv("FUSED_CLASSIFY_EXTRACT", "0") == "1"
+        self.classifier_agent = ClassifierAgent(llm, self.memory)
+        self.json_agent = JSONAgent(llm, self.memory)
+        self.email_agent = EmailAgent(llm, self.memory)
+        self.pdf_agent = PDFAgent(llm, self.memory)
 
-    def process_input(self, raw_input_content: str, thread_id: str = None):
+        # Optional background distillation of LLM intent labels into the local classifier
+        self.intent_trainer = None
+        interval = float(os.getenv("INTENT_TRAINER_INTERVAL_SECONDS", "0"))
+        if interval > 0:
+            self.intent_trainer = IntentTrainer.from_env(self.memory, self.classifier_agent.local, self.classifier_agent.llm)
+            self.intent_trainer.start(interval)
+
+    def process_input(self, raw_input_content: str, thread_id: str = None, on_field=None, mime_type: str = None):
         """
-        Main entry point for processing input.
+        Main entry point for processing input. mime_type, if known, skips format sniffing.
+        on_field(key, value), if given, receives extracted email/PDF fields as they stream in
+        (in fused mode that includes 'document_intent').
         """
         print("\n--- Starting New Input Processing ---")
+        # Binary inputs (paths, bytes, streams) travel as one DocumentHandle so they are read and parsed once
+        document = DocumentHandle.wrap(raw_input_content, mime_type) if DocumentHandle.accepts(raw_input_content) else raw_input_content
+
+        # Fused mode: when the format alone fixes the route, classify inside the extraction call
+        plan = self.classifier_agent.plan_fused(document, mime_type) if self.fused else None
+        if plan is not None:
+            return self._process_fused(document, thread_id, on_field, *plan)
         
         # Step 1: Classify Format and Intent
-        input_format, intent, current_thread_id = self.classifier_agent.classify(raw_input_content, thread_id)
+        input_format, intent, current_thread_id = self.classifier_agent.classify(document, thread_id, mime_type)
         
         # The ClassifierAgent's classify method already logs and returns the thread_id.
         # We should use this current_thread_id for further processing and return it.
         
         print(f"Routing to agent based on Format: {input_format}, Intent: {intent}")
 
-        result_data = {} # Initialize a dictionary to hold the agent's result
-
         # Step 2: Route to appropriate Agent
+        route = self._select_route(input_format, intent)
+        if route == "JSON":
+            text = self._text_input(document)
+            result_data = self.json_agent.process_json(text, current_thread_id, fallback=lambda tid: self.email_agent.process_email(text, tid, on_field))
+        elif route == "Email":
+            result_data = self.email_agent.process_email(self._text_input(document), current_thread_id, on_field)
+        elif route == "PDF":
+            result_data = self.pdf_agent.process_pdf(document, current_thread_id, on_field)
+        else: 
+            result_data = self._handle_unrouted(input_format, intent, current_thread_id)
+        
+        # Append the thread_id to the result data for easy access in the test cases
+        # This makes it easier to get the thread_id from the returned result.
+        result_data["thread_id"] = current_thread_id 
+        return result_data
+
+    async def aprocess_input(self, raw_input_content: str, thread_id: str = None, on_field=None, mime_type: str = None):
+        """
+        Async variant of process_input. Agents await the LLM, so many inputs can be
+        processed concurrently on one event loop (see aprocess_inputs).
+        """
+        print("\n--- Starting New Input Processing ---")
+        # Binary inputs (paths, bytes, streams) travel as one DocumentHandle so they are read and parsed once
+        document = DocumentHandle.wrap(raw_input_content, mime_type) if DocumentHandle.accepts(raw_input_content) else raw_input_content
+
+        plan = self.classifier_agent.plan_fused(document, mime_type) if self.fused else None
+        if plan is not None:
+            return await self._aprocess_fused(document, thread_id, on_field, *plan)
+
+        input_format, intent, current_thread_id = await self.classifier_agent.aclassify(document, thread_id, mime_type)
+        print(f"Routing to agent based on Format: {input_format}, Intent: {intent}")
+
+        route = self._select_route(input_format, intent)
+        if route == "JSON":
+            text = self._text_input(document)
+            result_data = await self.json_agent.aprocess_json(text, current_thread_id, fallback=lambda tid: self.email_agent.aprocess_email(text, tid, on_field))
+        elif route == "Email":
+            result_data = await self.email_agent.aprocess_email(self._text_input(document), current_thread_id, on_field)
+        elif route == "PDF":
+            result_data = await self.pdf_agent.aprocess_pdf(document, current_thread_id, on_field)
+        else:
+            result_data = self._handle_unrouted(input_format, intent, current_thread_id)
+
+        result_data["thread_id"] = current_thread_id
+        return result_data
+
+    async def aprocess_inputs(self, raw_inputs: list, thread_ids: list = None):
+        """
+        Processes a batch of inputs concurrently. The number of LLM calls actually in
+        flight is bounded by the LLM wrapper's concurrency limit.
+        """
+        thread_ids = thread_ids or [None] * len(raw_inputs)
+        return await asyncio.gather(*(
+            self.aprocess_input(raw_input, thread_id)
+            for raw_input, thread_id in zip(raw_inputs, thread_ids)
+        ))
+
+    def _text_input(self, document):
+        # The Email/JSON agents work on text; a DocumentHandle is decoded once
+        return document.decoded if isinstance(document, DocumentHandle) else document
+
+    def _fused_callback(self, raw_input_content: str, thread_id: str, input_format: str, guess, state: dict):
+        """
+        Builds the on_intent callback for fused mode: logs the classification before the
+        agent logs its extraction, keeping the usual order in shared memory.
+        """
+        def on_intent(intent):
+            _, intent, state["thread_id"] = self.classifier_agent.record_fused(input_format, intent, thread_id, guess, raw_input_content)
+            print(f"Routing to agent based on Format: {input_format}, Intent: {intent} (fused)")
+            # The agent was picked by format before the intent was known; just log which one
+            print("JSON Agent: Processing JSON content." if input_format == "JSON" else "Email Agent: Processing email/text content.")
+            return state["thread_id"]
+        return on_intent
+
+    def _process_fused(self, raw_input_content: str, thread_id: str, on_field, input_format: str, guess):
+        state = {"thread_id": thread_id}
+        on_intent = self._fused_callback(raw_input_content, thread_id, input_format, guess, state)
+        if input_format == "JSON":
+            text = self._text_input(raw_input_content)
+            result_data = self.json_agent.process_json(text, thread_id, on_intent=on_intent, fallback=lambda tid: self.email_agent.process_email(text, tid, on_field))
+        else:
+            result_data = self.email_agent.process_email(self._text_input(raw_input_content), thread_id, on_field, on_intent=on_intent)
+        result_data["thread_id"] = state["thread_id"]
+        return result_data
+
+    async def _aprocess_fused(self, raw_input_content: str, thread_id: str, on_field, input_format: str, guess):
+        state = {"thread_id": thread_id}
+        on_intent = self._fused_callback(raw_input_content, thread_id, input_format, guess, state)
+        if input_format == "JSON":
+            text = self._text_input(raw_input_content)
+            result_data = await self.json_agent.aprocess_json(text, thread_id, on_intent=on_intent, fallback=lambda tid: self.email_agent.aprocess_email(text, tid, on_field))
+        else:
+            result_data = await self.email_agent.aprocess_email(self._text_input(raw_input_content), thread_id, on_field, on_intent=on_intent)
+        result_data["thread_id"] = state["thread_id"]
+        return result_data
+
+    def _select_route(self, input_format: str, intent: str):
+        """
+        Decides which agent handles the input. Returns "JSON", "Email", "PDF" or None.
+        """
         if input_format == "JSON":
             if intent and "invoice" in intent.lower():
                 print("JSON Agent: Processing as potential Invoice JSON.")
-            result_data = self.json_agent.process_json(raw_input_content, current_thread_id)
+            return "JSON"
         elif input_format == "Email" or \
              (input_format == "Text" and intent is not None and ("email" in intent.lower() or "rfq" in intent.lower() or "complaint" in intent.lower() or "inquiry" in intent.lower())):
             print("Email Agent: Processing email/text content.")
-            result_data = self.email_agent.process_email(raw_input_content, current_thread_id)
-        # in main.py's process_input
-# ...
+            return "Email"
         elif input_format == "PDF":
             print("PDF Agent: Processing PDF content.")
-            # You'd pass the actual PDF file path or binary content here
-            # For testing, you'd need a sample PDF file
-            # For now, let's just use the placeholder as before, but note the change
-            # This will still likely fail if pdf_input is not a real PDF file path/content
-            # You would change the test case in __main__ to pass a valid PDF file.
-            result_data = self.pdf_agent.process_pdf(raw_input_content, current_thread_id)
-        # ...
-        else: 
-            print(f"No specific agent for format: {input_format} and intent: {intent}. Attempting generic processing if needed or re-evaluating.")
-            self.memory.log_interaction(
-                source="MultiAgentSystem",
-                input_type=input_format,
-                intent=intent if intent else "Unhandled",
-                extracted_values={"message": f"No specific agent for {input_format}/{intent}"},
-                thread_id=current_thread_id # Use the thread_id from classifier
-            )
-            result_data = {"status": "error", "message": "Unhandled format or intent"}
-        
-        # Append the thread_id to the result data for easy access in the test cases
-        # This makes it easier to get the thread_id from the returned result.
-        result_data["thread_id"] = current_thread_id 
-        return result_data
+            return "PDF"
+        return None
+
+    def _handle_unrouted(self, input_format: str, intent: str, thread_id: str):
+        print(f"No specific agent for format: {input_format} and intent: {intent}. Attempting generic processing if needed or re-evaluating.")
+        self.memory.log_interaction(
+            source="MultiAgentSystem",
+            input_type=input_format,
+            intent=intent if intent else "Unhandled",
+            extracted_values={"message": f"No specific agent for {input_format}/{intent}"},
+            thread_id=thread_id # Use the thread_id from classifier
+        )
+        return {"status": "error", "message": "Unhandled format or intent"}
 
 # --- Example Usage ---
 if __name__ == "__main__":
@@ -1,10 +1,14 @@
 import uuid
 import datetime
 import json
+import hashlib
+from collections import OrderedDict
 
 class SharedMemory:
-    def __init__(self):
+    def __init__(self, max_contents: int = 10000):
         self.data = {} # Using a dictionary for in-memory storage. Keyed by thread_id or conversation_id
+        self.contents = OrderedDict() # Content store: sha256 of the raw input -> text, oldest evicted first
+        self.max_contents = max_contents
 
     def log_interaction(self, source: str, input_type: str, intent: str, extracted_values: dict, thread_id: str = None):
         """
@@ -38,6 +42,34 @@ class SharedMemory:
         
         return thread_id # Return the thread_id for chaining
 
+    def store_content(self, text: str) -> str:
+        """
+        Stores raw input text once per distinct content and returns its sha256 hash.
+        """
+        content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        if content_hash in self.contents:
+            self.contents.move_to_end(content_hash)
+        else:
+            self.contents[content_hash] = text
+            if len(self.contents) > self.max_contents:
+                self.contents.popitem(last=False)
+        return content_hash
+
+    def get_content(self, content_hash: str):
+        """
+        Returns the text stored under content_hash, or None if unknown or evicted.
+        """
+        return self.contents.get(content_hash)
+
+    def iter_entries(self, source: str = None):
+        """
+        Yields (thread_id, entry) for every logged interaction, optionally from one source only.
+        """
+        for thread_id, entries in list(self.data.items()):
+            for entry in list(entries):
+                if source is None or entry["source"] == source:
+                    yield thread_id, entry
+
     def get_context(self, thread_id: str):
         """
         Retrieves all logged interactions for a given thread_id.
@@ -59,6 +91,7 @@ class SharedMemory:
         Clears all memory for testing purposes.
         """
         self.data = {}
+        self.contents = OrderedDict()
 
 # Global instance of shared memory (or pass it around)
 shared_memory = SharedMemory()
\ No newline at end of file
@@ -0,0 +1,87 @@
+import re
+
+# Cheap per-page signals of the fields PDFAgent extracts; each has a weight in PageRanker.weights
+SIGNAL_PATTERNS = {
+    "invoice_number": re.compile(r"\binvoice\s*(?:number|no\b\.?|#)|\binv[-#]?\d", re.IGNORECASE),
+    "total": re.compile(r"\b(?:grand\s+total|total(?:\s+due)?|amount\s+due|balance\s+due)\s*:", re.IGNORECASE),
+    "currency": re.compile(r"[$€£¥]|\b(?:USD|EUR|GBP|CHF|JPY|CAD|AUD)\b"),
+    "date": re.compile(
+        r"\b\d{4}-\d{2}-\d{2}\b|\b\d{1,2}[/.]\d{1,2}[/.]\d{2,4}\b"
+        r"|\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?\s+\d{1,2},?\s+\d{4}\b",
+        re.IGNORECASE
+    ),
+    "party": re.compile(r"^\s*(?:vendor|supplier|seller|bill\s+to|sold\s+to|customer)\s*:", re.IGNORECASE | re.MULTILINE),
+}
+NUMBER_PATTERN = re.compile(r"\d[\d,]*(?:\.\d+)?")
+WORD_PATTERN = re.compile(r"\S+")
+
+class PageRanker:
+    """
+    Scores PDF pages by how likely they are to hold the extracted fields, using only the page
+    text: field keyword signals (saturating counts), numeric density, table-likeness and a
+    small first/last page prior. A signal found on most pages (a running header, a currency
+    in every line item) counts less than one found on a single page.
+    """
+    weights = {
+        "invoice_number": 3.0,
+        "total": 4.0,
+        "currency": 1.5,
+        "date": 1.5,
+        "party": 2.5,
+        "numeric_density": 1.0,
+        "table": 0.5,
+        "first_page": 1.0,
+        "last_page": 0.5,
+    }
+    signal_saturation = 3 # Matches beyond this many per page add nothing
+
+    def __init__(self, weights: dict = None):
+        self.weights = dict(self.weights, **(weights or {}))
+
+    def features(self, text: str) -> dict:
+        """
+        Position-independent features of one page, each in [0, 1].
+        """
+        features = {
+            name: min(len(pattern.findall(text)), self.signal_saturation) / self.signal_saturation
+            for name, pattern in SIGNAL_PATTERNS.items()
+        }
+        words = WORD_PATTERN.findall(text)
+        features["numeric_density"] = len(NUMBER_PATTERN.findall(text)) / len(words) if words else 0.0
+        lines = [line for line in text.splitlines() if line.strip()]
+        # Table rows: lines carrying at least two separate numbers (qty, unit price, amount)
+        features["table"] = sum(1 for line in lines if len(NUMBER_PATTERN.findall(line)) >= 2) / len(lines) if lines else 0.0
+        return features
+
+    def score_pages(self, pages: dict, count: int) -> dict:
+        """
+        {page_index: score} for {page_index: text}; count is the document's page total.
+        """
+        features = {index: self.features(text) for index, text in pages.items()}
+        scanned = len(features) or 1
+        # Share of scanned pages each signal appears on, to discount ones repeated everywhere
+        spread = {
+            name: sum(1 for page in features.values() if page[name] > 0) / scanned
+            for name in SIGNAL_PATTERNS
+        }
+        scores = {}
+        for index, page in features.items():
+            score = sum(self.weights[name] * page[name] * (1.0 - spread[name] + 1.0 / scanned) for name in SIGNAL_PATTERNS)
+            score += self.weights["numeric_density"] * page["numeric_density"]
+            score += self.weights["table"] * page["table"]
+            if index == 0:
+                score += self.weights["first_page"]
+            if index == count - 1:
+                score += self.weights["last_page"]
+            scores[index] = score
+        return scores
+
+    def rank(self, pages: dict, count: int) -> list:
+        """
+        Page indexes, best first (earlier pages win ties).
+        """
+        scores = self.score_pages(pages, count)
+        return sorted(scores, key=lambda index: (-scores[index], index))
+
+# Global instance, shared by PDF agents
+page_ranker = PageRanker()
@@ -1,49 +1,384 @@
 # pdf_agent.py (Conceptual)
 from llm_wrapper import llm_wrapper
 from memory_module import shared_memory
-from pypdf import PdfReader # Or whatever PDF library you choose
-import io # For handling binary data
-import json
+from prompt_builder import PromptBuilder, local_token_estimate
+from document_handle import DocumentHandle
+from pdf_parallel import pdf_extractor
+from page_ranker import page_ranker
+from pdf_tables import table_extractor
+from concurrent.futures import ThreadPoolExecutor
+import os
+import re
+import asyncio
 
 class PDFAgent:
-    def __init__(self):
-        self.llm = llm_wrapper
-        self.memory = shared_memory
+    # Keys the extraction prompt asks for; streaming stops once all of them have arrived
+    output_fields = ['invoice_number', 'total_amount', 'currency', 'date_issued', 'vendor_name', 'customer_name']
 
-    def process_pdf(self, pdf_input: str, thread_id: str):
+    # Gemini response_schema for native structured output
+    response_schema = {
+        "type": "OBJECT",
+        "properties": {
+            "invoice_number": {"type": "STRING"},
+            "total_amount": {"type": "STRING"}, # Kept as printed; may be "N/A"
+            "currency": {"type": "STRING"},
+            "date_issued": {"type": "STRING"},
+            "vendor_name": {"type": "STRING"},
+            "customer_name": {"type": "STRING"},
+        },
+        "required": output_fields,
+    }
+
+    # Pages worth sending. strategy "priority": the first and last few, then pages mentioning a
+    # keyword (only the first keyword_scan_limit other pages are scanned). strategy "ranked": pages
+    # scored by the PageRanker, best first (documents longer than rank_scan_limit pages only have
+    # their first and last rank_scan_limit / 2 pages scored). Either way extraction stops once the
+    # pdf_extract token budget is filled. PDF_PAGE_STRATEGY overrides the default strategy.
+    page_selection = {
+        "strategy": "ranked",
+        "first": 3,
+        "last": 1,
+        "keywords": ["total", "invoice", "amount due"],
+        "keyword_scan_limit": 50,
+        "rank_scan_limit": 60,
+    }
+
+    # Chunked (map-reduce) mode: every page is packed into windows of at most chunk_tokens
+    # (default: the pdf_extract budget), extracted concurrently and merged field by field. Past
+    # max_chunks windows, the windows grow instead, so one document never fans out further.
+    chunking = {
+        "chunk_tokens": None,
+        "max_chunks": 16,
+    }
+
+    # How conflicting per-chunk values are merged: "vote" (value most chunks agree on, earliest
+    # on ties), "first" (earliest pages) or "last" (latest pages, where totals are printed)
+    merge_policy = {
+        "invoice_number": "vote",
+        "total_amount": "last",
+        "currency": "vote",
+        "date_issued": "first",
+        "vendor_name": "vote",
+        "customer_name": "vote",
+    }
+
+    def __init__(self, llm=None, memory=None, page_selection: dict = None, extractor=None, chunked: bool = None, chunking: dict = None, ranker=None, tables=None):
+        self.llm = llm or llm_wrapper # Defaults to the global wrapper; pass one to use another backend
+        self.memory = memory or shared_memory
+        self.extractor = extractor or pdf_extractor # Whole-document extraction on a process pool
+        self.prompts = PromptBuilder(self.llm) # Fits content to the per-task token budget
+        self.ranker = ranker or page_ranker # Scores pages for the "ranked" strategy
+        # Deterministic line item tables (pdf_tables.py); PDF_TABLE_EXTRACTION=0 leaves line items out
+        self.tables = tables or table_extractor
+        self.extract_tables = os.getenv("PDF_TABLE_EXTRACTION", "1") == "1"
+        self.page_selection = dict(self.page_selection, strategy=os.getenv("PDF_PAGE_STRATEGY") or self.page_selection["strategy"])
+        self.page_selection.update(page_selection or {})
+        self.chunking = dict(self.chunking, **(chunking or {}))
+        # Whole-document map-reduce extraction instead of the page selection; off by default (one call per chunk)
+        self.chunked = chunked if chunked is not None else os.getenv("PDF_CHUNKED_EXTRACTION", "0") == "1"
+        keywords = self.page_selection["keywords"]
+        self.keyword_pattern = re.compile("|".join(re.escape(k) for k in keywords), re.IGNORECASE) if keywords else None
+
+    def process_pdf(self, pdf_input, thread_id: str, on_field=None, chunked: bool = None):
+        """
+        Accepts PDF content (path, bytes, memoryview, mmap, binary file object or DocumentHandle), extracts text, then uses LLM for structured extraction.
+        If on_field is given, the response is streamed and on_field(key, value) is called
+        as soon as each field is complete. chunked overrides self.chunked for this call.
+        """
+        if chunked if chunked is not None else self.chunked:
+            return self.process_pdf_chunked(pdf_input, thread_id, on_field)
+        extracted_text, line_items, error_result = self._extract_text(pdf_input, thread_id)
+        if error_result:
+            return error_result
+
+        system_prompt, user_prompt = self._build_prompts(extracted_text)
+        if on_field is not None and line_items is not None:
+            on_field('line_items', line_items) # Known before the LLM is called
+        if on_field is not None:
+            extracted_data = self.llm.generate_response_stream(system_prompt, user_prompt, self.output_fields, on_field, schema=self.response_schema, profile="pdf_extract")
+        else:
+            extracted_data = self.llm.generate_structured(system_prompt, user_prompt, self.response_schema, profile="pdf_extract")
+        return self._finalize(extracted_data, thread_id, line_items)
+
+    async def aprocess_pdf(self, pdf_input, thread_id: str, on_field=None, chunked: bool = None):
+        """
+        Async variant of process_pdf; awaits the LLM instead of blocking on it.
+        """
+        if chunked if chunked is not None else self.chunked:
+            return await self.aprocess_pdf_chunked(pdf_input, thread_id, on_field)
+        # Parsing is blocking (and may wait on the process pool); keep it off the event loop
+        extracted_text, line_items, error_result = await asyncio.to_thread(self._extract_text, pdf_input, thread_id)
+        if error_result:
+            return error_result
+
+        system_prompt, user_prompt = await asyncio.to_thread(self._build_prompts, extracted_text) # fit may count tokens over the network
+        if on_field is not None and line_items is not None:
+            on_field('line_items', line_items) # Known before the LLM is called
+        if on_field is not None:
+            extracted_data = await self.llm.agenerate_response_stream(system_prompt, user_prompt, self.output_fields, on_field, schema=self.response_schema, profile="pdf_extract")
+        else:
+            extracted_data = await self.llm.agenerate_structured(system_prompt, user_prompt, self.response_schema, profile="pdf_extract")
+        return self._finalize(extracted_data, thread_id, line_items)
+
+    def process_pdf_chunked(self, pdf_input, thread_id: str, on_field=None):
+        """
+        Map-reduce extraction over every page: one structured call per token-bounded window, run
+        concurrently on threads (so latency follows the slowest chunk, not the page count), then
+        merged per merge_policy. The result adds field_pages ({field: [1-based page numbers]}),
+        conflicts ({field: [rejected values]}) and chunks. on_field, if given, gets line_items
+        first and then each field after the merge.
+        """
+        chunks, line_items, error_result = self._extract_chunks(pdf_input, thread_id)
+        if error_result:
+            return error_result
+        if on_field is not None and line_items is not None:
+            on_field('line_items', line_items)
+
+        system_prompt = self._system_prompt()
+        prompts = [self._chunk_prompt(text, budget) for _, text, budget in chunks]
+        workers = min(len(prompts), self.llm.max_concurrency)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(
+                lambda user_prompt: self.llm.generate_structured(system_prompt, user_prompt, self.response_schema, profile="pdf_extract"),
+                prompts
+            ))
+        return self._finalize(self._merge_chunks(results, chunks, on_field), thread_id, line_items)
+
+    async def aprocess_pdf_chunked(self, pdf_input, thread_id: str, on_field=None):
         """
-        Accepts PDF content (or path), extracts text, then uses LLM for structured extraction.
+        Async variant of process_pdf_chunked; the chunk calls are gathered under the wrapper's concurrency cap.
         """
-        extracted_text = ""
+        chunks, line_items, error_result = await asyncio.to_thread(self._extract_chunks, pdf_input, thread_id)
+        if error_result:
+            return error_result
+        if on_field is not None and line_items is not None:
+            on_field('line_items', line_items)
+
+        system_prompt = self._system_prompt()
+        prompts = await asyncio.gather(*(asyncio.to_thread(self._chunk_prompt, text, budget) for _, text, budget in chunks))
+        results = await asyncio.gather(*(
+            self.llm.agenerate_structured(system_prompt, user_prompt, self.response_schema, profile="pdf_extract")
+            for user_prompt in prompts
+        ))
+        return self._finalize(self._merge_chunks(results, chunks, on_field), thread_id, line_items)
+
+    def extract_full_text(self, pdf_input) -> str:
+        """
+        Whole-document text in page order (for archival or map-reduce extraction). Large files
+        are extracted in parallel; the pages are cached on the DocumentHandle (and on disk) for later use.
+        """
+        document = DocumentHandle.wrap(pdf_input)
+        return "\n".join(self.extractor.extract(document))
+
+    def _extract_text(self, pdf_input, thread_id: str):
+        """
+        Returns (extracted_text, line_items, error_result); error_result is None on success and
+        line_items None when table extraction is off. pdf_input may be a DocumentHandle from the
+        classifier, whose reader and already-extracted pages are reused instead of parsing the
+        file again. Table rows are left out of the text: the LLM only sees the header fields.
+        """
+        document = DocumentHandle.wrap(pdf_input)
+        budget = self.prompts.budget_for('pdf_extract')
+        pages = {}
+        used = 0
+        try:
+            line_items, page_text = self._extract_tables(document)
+            for index, text in self._iter_pages(document, page_text):
+                if text.strip():
+                    pages[index] = text
+                    used += local_token_estimate(text)
+                if used >= budget:
+                    break # The prompt is full; the remaining pages are never extracted
+            extracted_text = "\n".join(pages[index] for index in sorted(pages))
+            print(f"PDF Agent: Extracted text from {len(pages)} of {document.page_count} pages")
+        except Exception as e:
+            return None, None, self._extraction_error(e, thread_id)
+
+        if not extracted_text.strip() and not line_items:
+            return None, None, self._no_text(thread_id)
+
+        return extracted_text, line_items, None
+
+    def _extract_tables(self, document):
+        """
+        Returns (line_items, page_text): the document's line items (None when disabled) and a
+        page_text(index) function serving pages with their table rows removed.
+        """
+        if not self.extract_tables:
+            return None, document.page_text
+        line_items, residual = self.tables.extract(document)
+        if line_items:
+            print(f"PDF Agent: Extracted {len(line_items)} line items from {len(residual)} pages without the LLM")
+        return line_items, lambda index: residual[index] if index in residual else document.page_text(index)
+
+    def _extract_chunks(self, pdf_input, thread_id: str):
+        """
+        Returns (chunks, line_items, error_result); chunks are (page_numbers, text, token_budget)
+        windows covering every page with text (table rows removed), in page order.
+        """
+        document = DocumentHandle.wrap(pdf_input)
         try:
-            # Assuming pdf_input is the path to a PDF file for this example
-            # If pdf_input is binary content, you'd use io.BytesIO(pdf_input)
-            reader = PdfReader(pdf_input) # If using file path
-            # reader = PdfReader(io.BytesIO(pdf_input)) # If using binary content
-            for page in reader.pages:
-                extracted_text += page.extract_text() + "\n"
+            texts = self.extractor.extract(document)
+            line_items, page_text = self._extract_tables(document)
+            texts = [page_text(index) for index in range(len(texts))]
         except Exception as e:
-            print(f"PDF Agent: Error extracting text from PDF: {e}")
-            self.memory.log_interaction(
-                source="PDFAgent",
-                input_type="PDF",
-                intent="Extraction Error",
-                extracted_values={"error": f"Failed to extract text from PDF: {e}"},
-                thread_id=thread_id
-            )
-            return {"status": "error", "message": "Failed to extract text from PDF"}
-
-        if not extracted_text.strip():
-            print("PDF Agent: No readable text extracted from PDF.")
-            self.memory.log_interaction(
-                source="PDFAgent",
-                input_type="PDF",
-                intent="No Text",
-                extracted_values={"message": "No readable text extracted from PDF"},
-                thread_id=thread_id
-            )
-            return {"status": "error", "message": "No readable text extracted from PDF"}
+            return None, None, self._extraction_error(e, thread_id)
+
+        pages = [(index + 1, text) for index, text in enumerate(texts) if text.strip()]
+        if not pages:
+            return None, None, self._no_text(thread_id)
 
+        costs = [local_token_estimate(text) for _, text in pages]
+        budget = self.chunking["chunk_tokens"] or self.prompts.budget_for('pdf_extract')
+        groups = self._pack_pages(costs, budget)
+        max_chunks = self.chunking["max_chunks"]
+        if len(groups) > max_chunks:
+            # Grow the windows rather than fan one document out further: equal runs of pages
+            size = -(-len(pages) // max_chunks)
+            groups = [list(range(start, min(start + size, len(pages)))) for start in range(0, len(pages), size)]
+            budget = max(sum(costs[i] for i in group) for group in groups)
+        chunks = [([pages[i][0] for i in group], "\n".join(pages[i][1] for i in group), budget) for group in groups]
+        print(f"PDF Agent: Split {len(pages)} of {len(texts)} pages into {len(chunks)} chunks of up to {budget} tokens")
+        return chunks, line_items, None
+
+    def _pack_pages(self, costs: list, budget: int) -> list:
+        """
+        Groups consecutive page positions into windows of at most `budget` tokens; a page over
+        budget gets a window of its own (and is fitted to the budget in its prompt).
+        """
+        groups = []
+        used = 0
+        for i, cost in enumerate(costs):
+            if groups and used + cost <= budget:
+                groups[-1].append(i)
+                used += cost
+            else:
+                groups.append([i])
+                used = cost
+        return groups
+
+    def _merge_chunks(self, results: list, chunks: list, on_field=None):
+        """
+        Reduces per-chunk extractions to one result, resolving each field by merge_policy and
+        recording which pages the chosen value came from. None if every chunk failed.
+        """
+        if not any(results):
+            return None
+        merged = {}
+        field_pages = {}
+        conflicts = {}
+        for field in self.output_fields:
+            # normalized value -> [first spelling seen, page numbers, chunks reporting it]
+            candidates = {}
+            order = []
+            for result, (numbers, _, _) in zip(results, chunks):
+                value = (result or {}).get(field)
+                if value is None or str(value).strip().upper() in ("", "N/A"):
+                    continue
+                key = str(value).strip().casefold()
+                if key not in candidates:
+                    candidates[key] = [value, [], 0]
+                candidates[key][1].extend(numbers)
+                candidates[key][2] += 1
+                order.append(key)
+            if not candidates:
+                merged[field] = "N/A"
+                continue
+            policy = self.merge_policy.get(field, "vote")
+            if policy == "first":
+                chosen = order[0]
+            elif policy == "last":
+                chosen = order[-1]
+            else:
+                chosen = max(candidates, key=lambda key: candidates[key][2]) # First inserted wins ties
+            merged[field] = candidates[chosen][0]
+            field_pages[field] = candidates[chosen][1]
+            if len(candidates) > 1:
+                conflicts[field] = [candidates[key][0] for key in candidates if key != chosen]
+
+        if on_field is not None:
+            for field in self.output_fields:
+                on_field(field, merged[field])
+        failed = sum(1 for result in results if not result)
+        if failed:
+            print(f"PDF Agent: {failed} of {len(chunks)} chunk extractions failed")
+        merged.update(field_pages=field_pages, conflicts=conflicts, chunks=len(chunks))
+        return merged
+
+    def _extraction_error(self, error: Exception, thread_id: str) -> dict:
+        print(f"PDF Agent: Error extracting text from PDF: {error}")
+        self.memory.log_interaction(
+            source="PDFAgent",
+            input_type="PDF",
+            intent="Extraction Error",
+            extracted_values={"error": f"Failed to extract text from PDF: {error}"},
+            thread_id=thread_id
+        )
+        return {"status": "error", "message": "Failed to extract text from PDF"}
+
+    def _no_text(self, thread_id: str) -> dict:
+        print("PDF Agent: No readable text extracted from PDF.")
+        self.memory.log_interaction(
+            source="PDFAgent",
+            input_type="PDF",
+            intent="No Text",
+            extracted_values={"message": "No readable text extracted from PDF"},
+            thread_id=thread_id
+        )
+        return {"status": "error", "message": "No readable text extracted from PDF"}
+
+    def _iter_pages(self, document, page_text):
+        """
+        Yields (page_index, text) for the selected pages, most useful first; page_text(index)
+        supplies the text (document.page_text, or pages with their tables removed).
+        """
+        if self.page_selection["strategy"] == "ranked":
+            return self._iter_ranked_pages(document, page_text)
+        return self._iter_priority_pages(document, page_text)
+
+    def _iter_ranked_pages(self, document, page_text):
+        """
+        Yields (page_index, text) by PageRanker score. Scoring needs the text of every scanned
+        page, but no LLM call; the text stays on the handle (and in the text cache).
+        """
+        count = document.page_count
+        limit = self.page_selection["rank_scan_limit"]
+        if count <= limit:
+            indexes = range(count)
+        else:
+            # Headers open a document and totals close it; the middle of a long one is skipped
+            indexes = list(range(limit // 2)) + list(range(count - limit + limit // 2, count))
+        pages = {index: page_text(index) for index in indexes}
+        for index in self.ranker.rank(pages, count):
+            yield index, pages[index]
+
+    def _iter_priority_pages(self, document, page_text):
+        """
+        Yields (page_index, text) for the selected pages in priority order, extracting lazily.
+        """
+        count = document.page_count
+        first = min(self.page_selection["first"], count)
+        last = min(self.page_selection["last"], count)
+        # Opening and closing page first (headers, totals), then the rest of the first/last pages
+        priority = ([0] if first else []) + ([count - 1] if last else []) + list(range(1, first)) + list(range(count - last, count - 1))
+        seen = set()
+        for index in priority:
+            if index not in seen:
+                seen.add(index)
+                yield index, page_text(index)
+
+        if self.keyword_pattern is None:
+            return
+        scanned = 0
+        for index in range(first, count - last):
+            if scanned >= self.page_selection["keyword_scan_limit"]:
+                return
+            scanned += 1
+            text = page_text(index)
+            if self.keyword_pattern.search(text):
+                yield index, text
+
+    def _build_prompts(self, extracted_text: str):
         # Now use LLM to extract structured data from the extracted_text
         # This part will be very similar to your JSON Agent or Email Agent,
         # using a specific schema depending on the expected content of the PDF (e.g., Invoice, RFQ)
@@ -52,23 +387,23 @@ class PDFAgent:
         # You might retrieve the intent from memory or pass it explicitly.
         # For simplicity here, let's assume a generic extraction for now.
 
-        system_prompt = """You are a PDF content extraction agent. Extract key details from the provided text, focusing on invoice-like information.
-        Extract 'invoice_number', 'total_amount', 'currency', 'date_issued', 'vendor_name', 'customer_name'.
-        If a field is not found, use 'N/A'. Return the output as a JSON object."""
+        user_prompt = f"Extract information from the following PDF text:\n\n{self.prompts.fit(extracted_text, 'pdf_extract')}" # Limit text length
+        return self._system_prompt(), user_prompt
 
-        user_prompt = f"Extract information from the following PDF text:\n\n{extracted_text[:4000]}..." # Limit text length
+    def _chunk_prompt(self, text: str, budget: int) -> str:
+        # Same instructions as the single-call path; the excerpt is one window of the document
+        return f"Extract information from the following PDF text:\n\n{self.prompts.fit(text, budget=budget)}"
 
-        extracted_data_str = self.llm.generate_response(system_prompt, user_prompt, json_mode=True)
+    def _system_prompt(self) -> str:
+        return """You are a PDF content extraction agent. Extract key details from the provided text, focusing on invoice-like information.
+        Extract 'invoice_number', 'total_amount', 'currency', 'date_issued', 'vendor_name', 'customer_name'.
+        If a field is not found, use 'N/A'. Return the output as a JSON object."""
 
-        extracted_data = {}
-        if extracted_data_str:
-            try:
-                extracted_data = json.loads(extracted_data_str)
-            except json.JSONDecodeError as e:
-                print(f"PDF Agent: LLM returned invalid JSON: {e}")
-                extracted_data = {"status": "error", "message": "LLM output invalid JSON"}
-        else:
+    def _finalize(self, extracted_data: dict, thread_id: str, line_items: list = None):
+        if not extracted_data:
             extracted_data = {"status": "error", "message": "LLM extraction failed"}
+        elif line_items is not None:
+            extracted_data['line_items'] = line_items
 
         self.memory.log_interaction(
             source="PDFAgent",
@@ -78,4 +413,4 @@ class PDFAgent:
             thread_id=thread_id
         )
         print("PDF Agent: Processed PDF content.")
-        return extracted_data
\ No newline at end of file
+        return extracted_data
@@ -0,0 +1,106 @@
+import io
+import os
+import tempfile
+import threading
+
+def extract_page_range(source, start: int, stop: int) -> list:
+    """
+    Worker: opens the PDF independently (path or bytes) and returns the text of pages [start, stop).
+    Top-level so it can be pickled into a process pool.
+    """
+    from pypdf import PdfReader # Imported in the worker; the parent may never need pypdf
+    reader = PdfReader(source if isinstance(source, str) else io.BytesIO(source))
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+class ParallelPDFExtractor:
+    """
+    Extracts every page of a PDF by fanning page ranges out to a process pool and
+    reassembling the text in page order. Small documents are extracted in-process,
+    where pool overhead would dominate.
+    """
+    def __init__(self, workers: int = None, pages_per_task: int = 16, min_pages: int = 32):
+        self.workers = workers or os.cpu_count() or 1
+        self.pages_per_task = pages_per_task
+        self.min_pages = min_pages # Below this many pages the pool isn't worth it
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            workers=int(os.getenv("PDF_EXTRACT_WORKERS", "0")) or None,
+            pages_per_task=int(os.getenv("PDF_EXTRACT_PAGES_PER_TASK", "16")),
+            min_pages=int(os.getenv("PDF_EXTRACT_MIN_PAGES", "32")),
+        )
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                from concurrent.futures import ProcessPoolExecutor
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def extract(self, document) -> list:
+        """
+        Returns the text of every page of a DocumentHandle, in page order. Pages the handle
+        already has (in memory or in the persistent text cache) are not extracted again.
+        """
+        count = document.page_count
+        if self.workers <= 1 or count < self.min_pages:
+            return [document.page_text(index) for index in range(count)]
+
+        known = document.cached_page_texts()
+        if document.text_cache.enabled:
+            for index in range(count):
+                if index not in known:
+                    text = document.text_cache.get_page(document.sha256, index)
+                    if text is not None:
+                        known[index] = text
+        missing = [index for index in range(count) if index not in known]
+        if not missing:
+            return [known[index] for index in range(count)]
+
+        # Workers reopen the file by path, so only the path is pickled into each task. In-memory
+        # documents are spilled to a temporary file once rather than pickled per task
+        source = document.path
+        spilled = None
+        if source is None:
+            with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+                f.write(document.data)
+            source = spilled = f.name
+        try:
+            # At least one task per worker, but never more pages per task than configured
+            size = max(1, min(self.pages_per_task, -(-len(missing) // self.workers)))
+            ranges = self._ranges(missing, size)
+            pool = self._get_pool()
+            futures = [pool.submit(extract_page_range, source, start, stop) for start, stop in ranges]
+            extracted = {}
+            for (start, stop), future in zip(ranges, futures):
+                extracted.update(zip(range(start, stop), future.result()))
+        finally:
+            if spilled is not None:
+                os.unlink(spilled)
+        document.cache_page_texts(extracted)
+        known.update(extracted)
+        return [known[index] for index in range(count)]
+
+    def _ranges(self, indexes: list, size: int) -> list:
+        """
+        Groups sorted page indexes into contiguous [start, stop) ranges of at most `size` pages.
+        """
+        ranges = []
+        for index in indexes:
+            if ranges and ranges[-1][1] == index and index - ranges[-1][0] < size:
+                ranges[-1][1] = index + 1
+            else:
+                ranges.append([index, index + 1])
+        return [tuple(r) for r in ranges]
+
+# Global instance; the pool itself is only started on the first large document
+pdf_extractor = ParallelPDFExtractor.from_env()
@@ -0,0 +1,147 @@
+import os
+import re
+
+# Header cell text -> line item field. A table needs a description column plus two numeric ones.
+HEADER_ALIASES = {
+    "description": ["description", "item", "items", "product", "service", "details", "article"],
+    "quantity": ["qty", "quantity", "units", "hours", "qty."],
+    "unit_price": ["unit price", "price", "rate", "unit cost", "price each", "unit"],
+    "amount": ["amount", "total", "line total", "ext. price", "extended price", "net amount"],
+}
+NUMERIC_FIELDS = ("quantity", "unit_price", "amount")
+
+# Bump when table extraction changes, so stale line items are never served from the text cache
+TABLE_EXTRACTOR_VERSION = "1"
+
+CELL_PATTERN = re.compile(r"\S+(?: \S+)*") # Cells are separated by two or more spaces in layout text
+TABLE_END_PATTERN = re.compile(r"^\s*(sub-?total|total|tax|vat|balance|amount due)\b", re.IGNORECASE)
+NUMBER_CLEAN_PATTERN = re.compile(r"[$€£¥]|\b(?:USD|EUR|GBP|CHF|JPY|CAD|AUD)\b|,|\s")
+
+def parse_number(text: str):
+    """
+    "1,250.00 USD" -> 1250.0, "4" -> 4; None if the cell isn't a number.
+    """
+    cleaned = NUMBER_CLEAN_PATTERN.sub("", text)
+    negative = cleaned.startswith("(") and cleaned.endswith(")") # Accounting negatives
+    cleaned = cleaned.strip("()")
+    try:
+        value = float(cleaned)
+    except ValueError:
+        return None
+    value = -value if negative else value
+    return int(value) if value.is_integer() and "." not in cleaned else value
+
+class TableExtractor:
+    """
+    Rebuilds line item tables from pypdf's layout-mode text, which keeps each glyph near its
+    horizontal position: cells are runs separated by wide gaps, a header row (matched through
+    HEADER_ALIASES) fixes the columns, and following rows are assigned to the header cell they
+    overlap (or sit nearest to). Columns carry over page breaks until a totals row ends the table.
+    No LLM is involved; the rows are removed from the text sent for the header fields.
+    Results are stored in the document's PDFTextCache, so a repeat PDF is not laid out again.
+    """
+    header_aliases = HEADER_ALIASES
+
+    def __init__(self, max_pages: int = 500, header_scan_limit: int = 5):
+        self.max_pages = max_pages # Layout extraction costs about as much as plain text extraction
+        self.header_scan_limit = header_scan_limit # Give up after this many pages without a table
+        self._aliases = {alias: field for field, aliases in self.header_aliases.items() for alias in aliases}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_pages=int(os.getenv("PDF_TABLE_MAX_PAGES", "500")),
+            header_scan_limit=int(os.getenv("PDF_TABLE_HEADER_SCAN_LIMIT", "5")),
+        )
+
+    def extract(self, document):
+        """
+        Returns (line_items, residual) for a DocumentHandle. residual maps the index of every page
+        that held table rows to its text without them; other pages are unchanged.
+        """
+        cache = document.text_cache
+        variant = f"{TABLE_EXTRACTOR_VERSION}:{self.max_pages}:{self.header_scan_limit}" # Settings change the result
+        cached = cache.get_tables(document.sha256, variant) if cache.enabled else None
+        if cached is not None:
+            return cached
+        items, residual = self._extract(document)
+        if cache.enabled:
+            cache.put_tables(document.sha256, variant, items, residual)
+        return items, residual
+
+    def _extract(self, document):
+        count = document.page_count
+        if count > self.max_pages:
+            print(f"TableExtractor: only the first {self.max_pages} of {count} pages scanned for line items")
+        items = []
+        residual = {}
+        columns = None
+        last_table_page = -1
+        for index in range(min(count, self.max_pages)):
+            if columns is None and index - last_table_page > self.header_scan_limit:
+                break # No table in sight; don't lay out the rest of a long document
+            kept, columns, found = self._scan_page(document.page_layout_text(index), columns, items)
+            if found:
+                residual[index] = "\n".join(kept)
+                last_table_page = index
+        return items, residual
+
+    def _cells(self, line: str) -> list:
+        return [(match.start(), match.end(), match.group()) for match in CELL_PATTERN.finditer(line)]
+
+    def _header_columns(self, cells: list):
+        """
+        [(field, start, end)] if the cells form a line item header, else None.
+        """
+        columns = [(self._aliases.get(text.lower().rstrip(":")), start, end) for start, end, text in cells]
+        fields = [field for field, _, _ in columns if field is not None] # Unknown columns (SKU, VAT %) are skipped
+        if "description" not in fields or sum(field in NUMERIC_FIELDS for field in fields) < 2:
+            return None
+        return columns if len(set(fields)) == len(fields) else None
+
+    def _assign(self, cells: list, columns: list) -> dict:
+        row = {}
+        for start, end, text in cells:
+            # Overlapping header first, then the nearest one (right-aligned numbers drift a little)
+            field = min(columns, key=lambda column: (
+                max(0, column[1] - end, start - column[2]),
+                abs((column[1] + column[2]) - (start + end)),
+            ))[0]
+            if field is not None:
+                row[field] = f"{row[field]} {text}" if field in row else text
+        return row
+
+    def _scan_page(self, text: str, columns, items: list):
+        """
+        Appends the page's line items to `items`. Returns (kept_lines, columns, found_rows), where
+        columns are carried into the next page while the table is still open.
+        """
+        kept = []
+        found = False
+        previous_was_item = False
+        for line in text.splitlines():
+            cells = self._cells(line)
+            if not cells:
+                continue
+            header = self._header_columns(cells)
+            if header is not None:
+                columns, found, previous_was_item = header, True, False
+                continue
+            if columns is not None and TABLE_END_PATTERN.match(line):
+                columns = None
+            elif columns is not None:
+                row = self._assign(cells, columns)
+                numbers = {field: parse_number(row[field]) for field in NUMERIC_FIELDS if field in row}
+                if numbers and all(value is not None for value in numbers.values()) and row.get("description"):
+                    items.append(dict(description=row["description"], **numbers))
+                    found, previous_was_item = True, True
+                    continue
+                if previous_was_item and len(cells) == 1 and "description" in row:
+                    items[-1]["description"] += " " + row["description"] # Wrapped description
+                    continue
+            previous_was_item = False
+            kept.append(" ".join(text for _, _, text in cells))
+        return kept, columns, found
+
+# Global instance, shared by PDF agents
+table_extractor = TableExtractor.from_env()
@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+# Bump when page text extraction changes, so stale text is never served
+EXTRACTOR_VERSION = "1"
+
+def extractor_version() -> str:
+    """
+    EXTRACTOR_VERSION plus the installed pypdf version, read from package metadata
+    so pypdf itself isn't imported.
+    """
+    from importlib import metadata
+    try:
+        return f"{EXTRACTOR_VERSION}/pypdf-{metadata.version('pypdf')}"
+    except metadata.PackageNotFoundError:
+        return EXTRACTOR_VERSION
+
+class PDFTextCache:
+    """
+    Disk-backed (SQLite) cache of extracted PDF text at page granularity, keyed by the
+    SHA-256 of the file bytes plus the extractor version. Stores each document's page
+    count and table extraction results too, so a repeat PDF is served without being parsed
+    (or laid out for its tables). Whole documents are
+    evicted least recently used first once the stored text exceeds max_bytes.
+    """
+    def __init__(self, db_path: str = None, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS pdf_documents (doc_key TEXT PRIMARY KEY, page_count INTEGER, "
+                "text_bytes INTEGER NOT NULL DEFAULT 0, last_used REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS pdf_pages (doc_key TEXT NOT NULL, page INTEGER NOT NULL, text TEXT NOT NULL, "
+                "PRIMARY KEY (doc_key, page))"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS pdf_tables (doc_key TEXT NOT NULL, variant TEXT NOT NULL, result TEXT NOT NULL, "
+                "PRIMARY KEY (doc_key, variant))"
+            )
+            self._db.commit()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Builds a cache from PDF_TEXT_CACHE_* environment variables; disabled without a path.
+        """
+        return cls(
+            db_path=os.getenv("PDF_TEXT_CACHE_PATH") or None,
+            max_bytes=int(os.getenv("PDF_TEXT_CACHE_MAX_MB", "256")) * 1024 * 1024,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self._db is not None
+
+    def _key(self, sha256: str) -> str:
+        if self._version is None:
+            self._version = extractor_version()
+        return f"{sha256}:{self._version}"
+
+    def page_count(self, sha256: str):
+        """
+        Returns the cached page count (marking the document as recently used), or None.
+        """
+        if not self.enabled:
+            return None
+        key = self._key(sha256)
+        with self._lock:
+            row = self._db.execute("SELECT page_count FROM pdf_documents WHERE doc_key = ?", (key,)).fetchone()
+            if row is None or row[0] is None:
+                return None
+            self._db.execute("UPDATE pdf_documents SET last_used = ? WHERE doc_key = ?", (time.time(), key))
+            self._db.commit()
+            return row[0]
+
+    def set_page_count(self, sha256: str, count: int):
+        if not self.enabled:
+            return
+        key = self._key(sha256)
+        with self._lock:
+            self._touch(key)
+            self._db.execute("UPDATE pdf_documents SET page_count = ? WHERE doc_key = ?", (count, key))
+            self._db.commit()
+
+    def get_page(self, sha256: str, index: int):
+        """
+        Returns the cached text of one page, or None on a miss.
+        """
+        if not self.enabled:
+            return None
+        key = self._key(sha256)
+        with self._lock:
+            row = self._db.execute("SELECT text FROM pdf_pages WHERE doc_key = ? AND page = ?", (key, index)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put_pages(self, sha256: str, texts: dict):
+        """
+        Stores {page_index: text} in one transaction, then evicts down to max_bytes.
+        """
+        if not self.enabled or not texts:
+            return
+        key = self._key(sha256)
+        with self._lock:
+            self._touch(key)
+            added = 0
+            for index, text in texts.items():
+                cursor = self._db.execute(
+                    "INSERT OR IGNORE INTO pdf_pages (doc_key, page, text) VALUES (?, ?, ?)", (key, index, text)
+                )
+                if cursor.rowcount:
+                    added += len(text.encode("utf-8"))
+            self._db.execute("UPDATE pdf_documents SET text_bytes = text_bytes + ? WHERE doc_key = ?", (added, key))
+            self._evict(keep=key)
+            self._db.commit()
+
+    def put_page(self, sha256: str, index: int, text: str):
+        self.put_pages(sha256, {index: text})
+
+    def get_tables(self, sha256: str, variant: str):
+        """
+        Returns the cached (line_items, residual) of a table extractor `variant`, or None on a miss.
+        """
+        if not self.enabled:
+            return None
+        key = self._key(sha256)
+        with self._lock:
+            row = self._db.execute("SELECT result FROM pdf_tables WHERE doc_key = ? AND variant = ?", (key, variant)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        result = json.loads(row[0])
+        return result["items"], {int(index): text for index, text in result["residual"].items()}
+
+    def put_tables(self, sha256: str, variant: str, line_items: list, residual: dict):
+        if not self.enabled:
+            return
+        key = self._key(sha256)
+        result = json.dumps({"items": line_items, "residual": residual})
+        with self._lock:
+            self._touch(key)
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO pdf_tables (doc_key, variant, result) VALUES (?, ?, ?)", (key, variant, result)
+            )
+            if cursor.rowcount:
+                self._db.execute("UPDATE pdf_documents SET text_bytes = text_bytes + ? WHERE doc_key = ?", (len(result), key))
+            self._evict(keep=key)
+            self._db.commit()
+
+    def _touch(self, key: str):
+        # Caller holds the lock
+        self._db.execute(
+            "INSERT INTO pdf_documents (doc_key, last_used) VALUES (?, ?) "
+            "ON CONFLICT(doc_key) DO UPDATE SET last_used = excluded.last_used",
+            (key, time.time())
+        )
+
+    def _evict(self, keep: str):
+        # Caller holds the lock. Drops least recently used documents (never `keep`) until under max_bytes
+        total = self._db.execute("SELECT COALESCE(SUM(text_bytes), 0) FROM pdf_documents").fetchone()[0]
+        while total > self.max_bytes:
+            row = self._db.execute(
+                "SELECT doc_key, text_bytes FROM pdf_documents WHERE doc_key != ? ORDER BY last_used LIMIT 1", (keep,)
+            ).fetchone()
+            if row is None:
+                break
+            self._db.execute("DELETE FROM pdf_pages WHERE doc_key = ?", (row[0],))
+            self._db.execute("DELETE FROM pdf_tables WHERE doc_key = ?", (row[0],))
+            self._db.execute("DELETE FROM pdf_documents WHERE doc_key = ?", (row[0],))
+            total -= row[1]
+
+    def clear(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.execute("DELETE FROM pdf_pages")
+                self._db.execute("DELETE FROM pdf_tables")
+                self._db.execute("DELETE FROM pdf_documents")
+                self._db.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
+            if self._db is not None:
+                documents, text_bytes = self._db.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(text_bytes), 0) FROM pdf_documents"
+                ).fetchone()
+                stats.update(documents=documents, text_bytes=text_bytes)
+            return stats
+
+# Global instance shared by DocumentHandles; a no-op unless PDF_TEXT_CACHE_PATH is set
+pdf_text_cache = PDFTextCache.from_env()
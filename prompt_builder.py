@@ -0,0 +1,152 @@
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from llm_backends import estimate_tokens
+
+# Default input-token budgets per task. classify and pdf_extract roughly match the
+# old 1000 / 4000 character cut-offs; JSON payloads used to be sent whole.
+TASK_TOKEN_BUDGETS = {
+    "classify": 256,
+    "email_extract": 2000,
+    "json_remap": 3000,
+    "pdf_extract": 1000,
+    "classify_batch": 4000, # Whole packed prompt; each document is still fitted to "classify"
+}
+
+GAP_MARKER = "\n[...]\n" # Inserted where segments were dropped
+
+HEADER_PATTERN = re.compile(r"^\s*(From|To|Cc|Subject|Date|Invoice|Bill To|Ship To)\s*[:#]", re.IGNORECASE | re.MULTILINE)
+KEY_TERMS_PATTERN = re.compile(
+    r"\b(total|subtotal|amount|balance|due|invoice|tax|vat|qty|quantity|price|quote|order|currency|payment)\b",
+    re.IGNORECASE
+)
+NUMBER_PATTERN = re.compile(r"[$€£]\s?\d|\d[\d,]*\.\d{2}\b")
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+def local_token_estimate(text: str) -> int:
+    """
+    Cheap offline token estimate: words and punctuation marks, never below chars / 4.
+    """
+    return max(len(TOKEN_PATTERN.findall(text)), estimate_tokens(text))
+
+class PromptBuilder:
+    """
+    Fits prompt content to a per-task token budget. Content over budget is split into
+    segments and the most salient ones (headers, totals, first and last paragraphs)
+    are kept, in their original order, instead of a blind prefix. The backend's token count
+    (a network call for Gemini) is only asked for when the local estimate is within
+    count_band of the budget; async callers build prompts in a worker thread.
+    """
+    def __init__(self, llm=None, budgets: dict = None, count_cache_size: int = 1024, count_band: float = 0.25):
+        self.llm = llm # Anything with count_tokens(text); None means local estimates only
+        self.budgets = dict(TASK_TOKEN_BUDGETS, **(budgets or {}))
+        self.count_cache_size = count_cache_size
+        self.count_band = count_band # Relative distance from the budget where the local estimate can't decide
+        self._counts = OrderedDict() # sha1(text) -> token count from the backend
+        self._ratio = 1.0 # Running backend count / local estimate, applied where the backend isn't asked
+        self._lock = threading.Lock()
+
+    def budget_for(self, task: str) -> int:
+        return self.budgets[task]
+
+    def count_tokens(self, text: str) -> int:
+        """
+        Counts tokens through the backend (cached), falling back to the local estimate.
+        """
+        if self.llm is None:
+            return local_token_estimate(text)
+        key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            count = self._counts.get(key)
+            if count is not None:
+                self._counts.move_to_end(key)
+                return count
+        try:
+            count = self.llm.count_tokens(text) # Outside the lock: concurrent counts don't queue up
+        except Exception:
+            return local_token_estimate(text)
+        with self._lock:
+            self._ratio += 0.2 * (count / max(1, local_token_estimate(text)) - self._ratio)
+            self._counts[key] = count
+            if len(self._counts) > self.count_cache_size:
+                self._counts.popitem(last=False)
+        return count
+
+    def fit(self, text: str, task: str = None, budget: int = None) -> str:
+        """
+        Returns text unchanged if it fits the budget (given directly or via task),
+        otherwise the highest-priority segments that fit, joined by GAP_MARKER.
+        """
+        budget = budget if budget is not None else self.budget_for(task)
+        if not text:
+            return text
+        estimate = local_token_estimate(text)
+        calibrated = estimate * self._ratio if self.llm is not None else estimate
+        if calibrated <= budget * (1 - self.count_band):
+            return text # Clearly fits; skip the backend count
+        if calibrated >= budget * (1 + self.count_band):
+            total = calibrated # Clearly over; the calibrated estimate is enough to cut it down
+        else:
+            total = self.count_tokens(text)
+        if total <= budget:
+            return text
+
+        # Segment costs come from the local estimator, scaled to agree with the backend's total
+        scale = total / max(1, estimate)
+        segments, joiner = self._split(text)
+        costs = [local_token_estimate(segment) * scale for segment in segments]
+        marker_cost = local_token_estimate(GAP_MARKER.strip()) * scale
+
+        order = sorted(range(len(segments)), key=lambda i: (-self._score(segments[i], i, len(segments)), i))
+        chosen = {}
+        remaining = budget
+        for i in order:
+            cost = costs[i] + marker_cost
+            if cost <= remaining:
+                chosen[i] = segments[i]
+                remaining -= cost
+            elif not chosen and remaining > marker_cost:
+                # Nothing fits yet (one huge segment): keep the head of the best one
+                keep_chars = int(len(segments[i]) * (remaining - marker_cost) / max(1.0, costs[i]))
+                chosen[i] = segments[i][:keep_chars]
+                remaining = 0
+            if remaining <= marker_cost:
+                break
+
+        parts = []
+        previous = None
+        for i in sorted(chosen):
+            if previous is None:
+                if i != 0:
+                    parts.append(GAP_MARKER.lstrip("\n"))
+            else:
+                parts.append(joiner if i == previous + 1 else GAP_MARKER)
+            parts.append(chosen[i])
+            previous = i
+        if previous != len(segments) - 1:
+            parts.append(GAP_MARKER.rstrip("\n"))
+        return "".join(parts)
+
+    def _split(self, text: str):
+        """
+        Returns (segments, joiner): paragraphs, or lines when the text has few blank lines.
+        """
+        segments = [segment for segment in re.split(r"\n\s*\n", text) if segment.strip()]
+        if len(segments) > 2:
+            return segments, "\n\n"
+        return [line for line in text.splitlines() if line.strip()], "\n"
+
+    def _score(self, segment: str, index: int, count: int) -> float:
+        score = 0.0
+        if index == 0:
+            score += 3 # Opening: headers, title, greeting
+        if index == count - 1:
+            score += 2 # Closing: totals, signature, sign-off
+        if HEADER_PATTERN.search(segment):
+            score += 3
+        key_terms = len(KEY_TERMS_PATTERN.findall(segment))
+        score += min(key_terms, 3)
+        if NUMBER_PATTERN.search(segment):
+            score += 1
+        return score
@@ -0,0 +1,151 @@
+import os
+import time
+import random
+import asyncio
+import threading
+
+class TokenBucket:
+    """
+    Classic token bucket refilled continuously at capacity_per_minute / 60 per second.
+    """
+    def __init__(self, capacity_per_minute: float):
+        self.capacity = float(capacity_per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """
+        Seconds until `amount` tokens are available (0 if they are available now).
+        """
+        self._refill(now)
+        amount = min(amount, self.capacity) # A single oversized request may drain the bucket but never waits forever
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+class RateLimiter:
+    """
+    Client-side limiter for Gemini quotas with separate requests-per-minute and
+    tokens-per-minute buckets. A rate-limit error from the API pauses every caller
+    for an exponentially growing, jittered delay.
+    """
+    def __init__(self, requests_per_minute: float = None, tokens_per_minute: float = None,
+                 max_retries: int = 5, base_backoff: float = 1.0, max_backoff: float = 60.0):
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._paused_until = 0.0 # Set after a 429 so every caller backs off, not just the one that hit it
+
+        # Metrics
+        self.waiting = 0 # Current queue depth: callers blocked on the limiter
+        self.max_waiting = 0
+        self.throttled = 0 # Rate-limit errors returned by the API
+        self.total_wait_seconds = 0.0
+
+    @classmethod
+    def from_env(cls):
+        """
+        Builds a limiter from LLM_* environment variables; unset quotas are unlimited.
+        """
+        return cls(
+            requests_per_minute=float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0")),
+            tokens_per_minute=float(os.getenv("LLM_TOKENS_PER_MINUTE", "0")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "5")),
+        )
+
+    @staticmethod
+    def is_rate_limit_error(e: Exception) -> bool:
+        # google.api_core raises ResourceExhausted (HTTP 429) when a quota is hit
+        return type(e).__name__ in ("ResourceExhausted", "TooManyRequests") or getattr(e, "code", None) == 429
+
+    def _reserve(self, tokens: float) -> float:
+        """
+        Takes one request and `tokens` tokens if both buckets allow it; otherwise returns the wait in seconds.
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._paused_until - now)
+            if self.request_bucket:
+                wait = max(wait, self.request_bucket.wait_time(1, now))
+            if self.token_bucket:
+                wait = max(wait, self.token_bucket.wait_time(tokens, now))
+            if wait == 0.0:
+                if self.request_bucket:
+                    self.request_bucket.consume(1)
+                if self.token_bucket:
+                    self.token_bucket.consume(tokens)
+            return wait
+
+    def _enter_queue(self):
+        with self._lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+
+    def _leave_queue(self, waited: float):
+        with self._lock:
+            self.waiting -= 1
+            self.total_wait_seconds += waited
+
+    def acquire(self, tokens: float = 0):
+        """
+        Blocks until a request costing `tokens` fits within both quotas.
+        """
+        wait = self._reserve(tokens)
+        if wait == 0.0:
+            return
+        self._enter_queue()
+        started = time.monotonic()
+        try:
+            while wait > 0.0:
+                time.sleep(wait)
+                wait = self._reserve(tokens)
+        finally:
+            self._leave_queue(time.monotonic() - started)
+
+    async def aacquire(self, tokens: float = 0):
+        """
+        Async counterpart of acquire; yields to the event loop while waiting.
+        """
+        wait = self._reserve(tokens)
+        if wait == 0.0:
+            return
+        self._enter_queue()
+        started = time.monotonic()
+        try:
+            while wait > 0.0:
+                await asyncio.sleep(wait)
+                wait = self._reserve(tokens)
+        finally:
+            self._leave_queue(time.monotonic() - started)
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Records a rate-limit error and returns the jittered delay before retry `attempt` (0-based).
+        All callers are paused for at least that long.
+        """
+        delay = min(self.max_backoff, self.base_backoff * (2 ** attempt))
+        delay = delay / 2 + random.uniform(0, delay / 2) # Equal jitter keeps retries from synchronising
+        with self._lock:
+            self.throttled += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        return delay
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "queue_depth": self.waiting,
+                "max_queue_depth": self.max_waiting,
+                "throttled": self.throttled,
+                "total_wait_seconds": round(self.total_wait_seconds, 3),
+            }
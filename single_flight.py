@@ -0,0 +1,83 @@
+import asyncio
+import threading
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller does the work and
+    every caller that arrives while it is in flight waits for and receives the same result.
+    Threaded callers (do) and coroutines (ado) are tracked separately.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {} # key -> _Call for the threaded path
+        self._futures = {} # (event loop, key) -> asyncio.Future for the async path
+        self.coalesced = 0 # Number of callers that piggybacked on an in-flight call
+
+    def do(self, key: str, fn):
+        """
+        Runs fn() unless a call with the same key is already running, in which case
+        blocks until it finishes and returns (or raises) its outcome.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    async def ado(self, key: str, coro_fn):
+        """
+        Async counterpart of do; coro_fn is a zero-argument callable returning an awaitable.
+        """
+        loop = asyncio.get_running_loop()
+        flight_key = (loop, key)
+        future = self._futures.get(flight_key)
+        if future is not None:
+            self.coalesced += 1
+            # Shield so a cancelled follower doesn't cancel the shared call
+            return await asyncio.shield(future)
+
+        future = loop.create_future()
+        self._futures[flight_key] = future
+        try:
+            result = await coro_fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception() # Mark as retrieved so an unobserved failure isn't logged twice
+            raise
+        finally:
+            del self._futures[flight_key]
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls) + len(self._futures)